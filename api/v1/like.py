@@ -6,6 +6,7 @@ from pylon.core.tools import log
 from tools import api_tools, auth
 
 from ...utils.constants import PROMPT_LIB_MODE
+from ...utils.like_utils import fire_like_changed_event
 
 
 class PromptLibAPI(api_tools.APIModeHandler):
@@ -25,6 +26,7 @@ class PromptLibAPI(api_tools.APIModeHandler):
             return {"ok": False, "error": "No response"}, 500
         except IntegrityError:
             return {"ok": False, "error": "Already liked"}, 400
+        fire_like_changed_event(project_id, entity, entity_id, auth.current_user().get('id'), liked=True)
         return result, 201
 
     # @auth.decorators.check_api({
@@ -40,6 +42,7 @@ class PromptLibAPI(api_tools.APIModeHandler):
                 project_id=project_id, entity=entity, entity_id=entity_id)
         except Empty:
             return {"ok": False, "error": "No response"}, 500
+        fire_like_changed_event(project_id, entity, entity_id, auth.current_user().get('id'), liked=False)
         return result, 204
 
 
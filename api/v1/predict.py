@@ -23,6 +23,7 @@ from tools import api_tools, db, auth, config as c
 from ...utils.constants import PROMPT_LIB_MODE
 from ...utils.conversation import prepare_conversation, CustomTemplateError, prepare_payload, \
     convert_messages_to_langchain
+from ...utils.token_utils import pack_context, TokenAccountant
 
 # TODO add more models or find an API to get tokens limit
 MODEL_TOKENS_MAPPER = {
@@ -102,6 +103,7 @@ class ProjectAPI(api_tools.APIModeHandler):
             if embedding:
                 embedding["top_k"] = payload.get("embedding_settings", {}).get("top_k", 20)
                 embedding["cutoff"] = payload.get("embedding_settings", {}).get("cutoff", 0.1)
+                embedding["packing"] = payload.get("embedding_settings", {}).get("packing", "greedy")
         else:
             _context = data.context
             embedding = {}
@@ -124,12 +126,13 @@ class ProjectAPI(api_tools.APIModeHandler):
                                                                                                  _input,
                                                                                                  embedding["top_k"],
                                                                                                  embedding["cutoff"])
-                for item in results_list:
-                    if len(encoding.encode(item + _context)) <= tokens_for_context:
-                        _context += item
-                    else:
-                        break
-                tokens_for_context = len(encoding.encode(_context))
+                _context, tokens_for_context = pack_context(
+                    encoding=encoding,
+                    context=_context,
+                    chunks=results_list,
+                    token_budget=tokens_for_context,
+                    strategy=embedding.get("packing", "greedy"),
+                )
                 total_tokens = tokens_for_context + tokens_for_completion
                 log.info(f"total_tokens = {total_tokens}")
         except Exception as e:
@@ -221,17 +224,17 @@ class PromptLibAPI(api_tools.APIModeHandler):
         #
         current_user = auth.current_user()
         #
-        tokens_in = worker_client.ai_count_tokens(
-            integration_name=payload.integration.name,
-            settings=payload,
-            data=result['content'],
-        )
-        #
-        tokens_out = worker_client.ai_count_tokens(
-            integration_name=payload.integration.name,
-            settings=payload,
-            data=conversation,
-        )
+        accountant = TokenAccountant(worker_client, payload.integration.name, payload)
+        # usage reported by the model needs no counting, known messages are served from cache
+        usage = result.get('usage_metadata') or {}
+        tokens_in = usage.get('output_tokens')
+        if tokens_in is None:
+            tokens_in = accountant.text_tokens(result['content'])
+        else:
+            accountant.remember_text(result['content'], tokens_in)
+        tokens_out = usage.get('input_tokens')
+        if tokens_out is None:
+            tokens_out = accountant.conversation_tokens(conversation)
         #
         conversation = convert_messages_to_langchain(conversation)
         #
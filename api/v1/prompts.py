@@ -14,6 +14,7 @@ from ...models.pd.search import SearchDataModel
 
 from ...utils.constants import PROMPT_LIB_MODE
 from ...utils.create_utils import create_prompt
+from ...utils.pagination import COUNT_MODES, InvalidCursor
 from ...utils.prompt_utils import list_prompts_api
 from ...utils.prompt_utils_legacy import prompts_create_prompt
 
@@ -76,25 +77,34 @@ class PromptLibAPI(api_tools.APIModeHandler):
             "id": request.args.get('collection_id', type=int),
             "owner_id": request.args.get('collection_owner_id', type=int)
         }
-        some_result = list_prompts_api(
-            project_id=project_id,
-            tags=request.args.get('tags'),
-            author_id=request.args.get('author_id'),
-            q=request.args.get('query'),
-            limit=request.args.get("limit", default=None,),
-            offset=request.args.get("offset", default=0, type=int),
-            sort_by=request.args.get("sort_by", default="created_at"),
-            sort_order=request.args.get("sort_order", default='desc'),
-            my_liked=request.args.get('my_liked', False),
-            trend_start_period=request.args.get('trend_start_period'),
-            trend_end_period=request.args.get('trend_end_period'),
-            statuses=request.args.get('statuses'),
-            collection=collection,
-            search_data=search_data
-        )
+        count_mode = request.args.get('count', default='exact')
+        if count_mode not in COUNT_MODES:
+            return {'error': f'count must be one of {COUNT_MODES}'}, 400
+        try:
+            some_result = list_prompts_api(
+                project_id=project_id,
+                tags=request.args.get('tags'),
+                author_id=request.args.get('author_id'),
+                q=request.args.get('query'),
+                limit=request.args.get("limit", default=None, type=int),
+                offset=request.args.get("offset", default=0, type=int),
+                sort_by=request.args.get("sort_by", default="created_at"),
+                sort_order=request.args.get("sort_order", default='desc'),
+                my_liked=request.args.get('my_liked', False),
+                trend_start_period=request.args.get('trend_start_period'),
+                trend_end_period=request.args.get('trend_end_period'),
+                statuses=request.args.get('statuses'),
+                collection=collection,
+                search_data=search_data,
+                cursor=request.args.get('cursor'),
+                count_mode=count_mode,
+            )
+        except InvalidCursor as e:
+            return {'error': str(e)}, 400
         parsed = MultiplePromptListModel(prompts=some_result['prompts'])
         return {
             'total': some_result['total'],
+            'next_cursor': some_result['next_cursor'],
             'rows': [
                 json.loads(i.json())
                 for i in parsed.prompts
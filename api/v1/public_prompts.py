@@ -9,6 +9,7 @@ from ....promptlib_shared.models.enums.all import PublishStatus
 from ...models.pd.search import SearchDataModel
 
 from ...utils.constants import PROMPT_LIB_MODE
+from ...utils.pagination import COUNT_MODES, InvalidCursor
 from ...utils.prompt_utils import list_prompts_api
 from ....promptlib_shared.utils.utils import add_public_project_id
 
@@ -33,24 +34,33 @@ class PromptLibAPI(api_tools.APIModeHandler):
         except Exception:
             search_data = None
 
-        some_result = list_prompts_api(
-            project_id=project_id,
-            tags=request.args.get('tags'),
-            author_id=request.args.get('author_id'),
-            q=request.args.get('query'),
-            limit=request.args.get("limit", default=10, type=int),
-            offset=request.args.get("offset", default=0, type=int),
-            sort_by=request.args.get("sort_by", default="created_at"),
-            sort_order=request.args.get("sort_order", default='desc'),
-            my_liked=request.args.get('my_liked', False),
-            trend_start_period=request.args.get('trend_start_period'),
-            trend_end_period=request.args.get('trend_end_period'),
-            statuses=[PublishStatus.published],
-            search_data=search_data
-        )
+        count_mode = request.args.get('count', default='exact')
+        if count_mode not in COUNT_MODES:
+            return {'error': f'count must be one of {COUNT_MODES}'}, 400
+        try:
+            some_result = list_prompts_api(
+                project_id=project_id,
+                tags=request.args.get('tags'),
+                author_id=request.args.get('author_id'),
+                q=request.args.get('query'),
+                limit=request.args.get("limit", default=10, type=int),
+                offset=request.args.get("offset", default=0, type=int),
+                sort_by=request.args.get("sort_by", default="created_at"),
+                sort_order=request.args.get("sort_order", default='desc'),
+                my_liked=request.args.get('my_liked', False),
+                trend_start_period=request.args.get('trend_start_period'),
+                trend_end_period=request.args.get('trend_end_period'),
+                statuses=[PublishStatus.published],
+                search_data=search_data,
+                cursor=request.args.get('cursor'),
+                count_mode=count_mode,
+            )
+        except InvalidCursor as e:
+            return {'error': str(e)}, 400
         parsed = MultiplePublishedPromptListModel(prompts=some_result['prompts'])
         return {
             'total': some_result['total'],
+            'next_cursor': some_result['next_cursor'],
             'rows': [
                 json.loads(i.json(exclude={'status'}))
                 for i in parsed.prompts
@@ -1,3 +1,4 @@
+from functools import partial
 from traceback import format_exc
 
 from flask import request
@@ -8,7 +9,7 @@ from pylon.core.tools import log
 from ...models.pd.misc import MultiplePromptSearchModel
 from ...models.all import Prompt, PromptVersion, PromptVersionTagAssociation
 from ...utils.constants import PROMPT_LIB_MODE
-from ...utils.searches import get_search_options_one_entity
+from ...utils.searches import get_search_options_one_entity, run_search_sections
 
 
 def _merge_search_options_results(search_results):
@@ -51,60 +52,55 @@ class PromptLibAPI(api_tools.APIModeHandler):
     @api_tools.endpoint_metrics
     def get(self, project_id: int):
         results = {}
+        timings = {}
+        prompt_timings = {}
+        timed_out = []
+        prompt_timed_out = []
         entities = set(request.args.getlist('entities[]'))
 
         for entity in ('prompt', 'application', 'datasource', 'pipeline', 'toolkit'):
             results[entity] = {"total": 0, "rows": []}
 
-        try:
-            if "prompt" in entities:
-                res = get_search_options_one_entity(
-                    project_id,
-                    'prompt',
-                    Prompt,
-                    PromptVersion,
-                    MultiplePromptSearchModel,
-                    PromptVersionTagAssociation
+        def rpc_section(rpc_name: str, plugin: str, *args, **kwargs):
+            try:
+                return getattr(self.module.context.rpc_manager.timeout(2), rpc_name)(*args, **kwargs)
+            except Empty:
+                log.warning(f"{plugin} plugin is not available, skipping for search_options")
+                return {}
+
+        # sections are merged in this order, later ones win on shared keys e.g. collection and tag
+        sections = {}
+        if "prompt" in entities:
+            sections['prompt'] = partial(
+                get_search_options_one_entity,
+                project_id,
+                'prompt',
+                Prompt,
+                PromptVersion,
+                MultiplePromptSearchModel,
+                PromptVersionTagAssociation,
+                timings=prompt_timings,
+                timed_out=prompt_timed_out
+            )
+        if 'toolkit' in entities:
+            def toolkit_section():
+                res = rpc_section(
+                    'applications_get_toolkit_search_options', 'Application',
+                    project_id, **request.args.to_dict()
                 )
-                results.update(res)
+                return {'toolkit': res} if res else {}
+            sections['toolkit'] = toolkit_section
+        if "datasource" in entities:
+            sections['datasource'] = partial(rpc_section, 'datasources_get_search_options', 'Datasource', project_id)
+        if "application" in entities:
+            sections['application'] = partial(rpc_section, 'applications_get_search_options', 'Application', project_id)
+        if "pipeline" in entities:
+            sections['pipeline'] = partial(
+                rpc_section, 'applications_get_search_options', 'Application', project_id, pipeline=True
+            )
 
-            if 'toolkit' in entities:
-                try:
-                    res = self.module.context.rpc_manager.timeout(2).applications_get_toolkit_search_options(
-                        project_id,
-                        **request.args.to_dict()
-                    )
-                except Empty:
-                    log.warning("Application plugin is not available, skipping toolkits for search_options")
-                else:
-                    results['toolkit'] = res
-
-            if "datasource" in entities:
-                try:
-                    res = self.module.context.rpc_manager.timeout(2).datasources_get_search_options(project_id)
-                except Empty:
-                    log.warning("Datasource plugin is not available, skipping for search_options")
-                else:
-                    results.update(res)
-
-            if "application" in entities:
-                try:
-                    res = self.module.context.rpc_manager.timeout(2).applications_get_search_options(project_id)
-                except Empty:
-                    log.warning("Application plugin is not available, skipping for search_options")
-                else:
-                    results.update(res)
-
-            if "pipeline" in entities:
-                try:
-                    res = self.module.context.rpc_manager.timeout(2).applications_get_search_options(
-                       project_id,
-                       pipeline=True
-                    )
-                except Empty:
-                    log.warning("Application plugin is not available, skipping for search_options")
-                else:
-                    results.update(res)
+        try:
+            section_results = run_search_sections(sections, timings, timed_out)
         except AttributeError as ex:
             log.error(ex)
             return {"error": f"One of the search conditions has invalid value: {ex.name}"}, 400
@@ -112,7 +108,20 @@ class PromptLibAPI(api_tools.APIModeHandler):
             log.error(format_exc())
             return {"error": str(ex)}, 400
 
+        for res in section_results.values():
+            if res:
+                results.update(res)
+        # sections of prompt search itself, e.g. prompt.collection
+        timings.update({f'prompt.{k}': v for k, v in prompt_timings.items()})
+        timed_out.extend(f'prompt.{name}' for name in prompt_timed_out)
+
         result = _merge_search_options_results(results)
+        for name in timed_out:
+            if name in result:
+                # empty because it did not finish, not because nothing matched
+                result[name]['timed_out'] = True
+        result['timings'] = timings
+        result['timed_out'] = timed_out
 
         return result, 200
 
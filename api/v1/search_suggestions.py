@@ -0,0 +1,36 @@
+from flask import request
+from tools import api_tools, auth, config as c
+
+from ...utils.constants import PROMPT_LIB_MODE
+from ...utils.suggest import SEARCH_SUGGESTIONS
+
+
+class PromptLibAPI(api_tools.APIModeHandler):
+    @auth.decorators.check_api({
+        "permissions": ["models.prompt_lib.search_requests.list"],
+        "recommended_roles": {
+            c.ADMINISTRATION_MODE: {"admin": True, "editor": True, "viewer": False},
+            c.DEFAULT_MODE: {"admin": True, "editor": True, "viewer": True},
+        }})
+    def get(self, project_id: int):
+        rows = SEARCH_SUGGESTIONS.suggest(
+            project_id,
+            request.args.get('prefix', ''),
+            limit=request.args.get('limit', type=int)
+        )
+        return {
+            'total': len(rows),
+            'rows': rows
+        }, 200
+
+
+class API(api_tools.APIBase):
+    url_params = api_tools.with_modes(
+        [
+            "<int:project_id>",
+        ]
+    )
+
+    mode_handlers = {
+        PROMPT_LIB_MODE: PromptLibAPI,
+    }
@@ -1,9 +1,12 @@
 import json
 from typing import List
+
+from flask import request
 from pylon.core.tools import log
 
 from tools import api_tools, auth, config as c
 
+from ...utils.leaderboard import LEADERBOARD_WINDOWS
 from ...utils.utils import get_trending_authors
 from ...models.pd.authors import TrendingAuthorModel
 from ...utils.constants import PROMPT_LIB_MODE
@@ -21,7 +24,14 @@ class PromptLibAPI(api_tools.APIModeHandler):
     )
     @api_tools.endpoint_metrics
     def get(self, project_id: int):
-        authors: List[TrendingAuthorModel] = get_trending_authors(project_id)
+        window = request.args.get('window', 'all')
+        if window not in LEADERBOARD_WINDOWS:
+            return {'error': f'window must be one of {list(LEADERBOARD_WINDOWS)}'}, 400
+        authors: List[TrendingAuthorModel] = get_trending_authors(
+            project_id,
+            limit=request.args.get('limit', 5, type=int),
+            window=window
+        )
         return [json.loads(author.json()) for author in authors], 200
 
 class API(api_tools.APIBase):
@@ -9,6 +9,7 @@ from sqlalchemy.exc import IntegrityError
 from ...models.all import PromptVersion
 from ...models.enums.events import PromptEvents
 from ...models.pd.prompt_version import PromptVersionDetailModel, PromptVersionCreateModel, PromptVersionUpdateModel
+from ...utils.conversation import fire_prompt_version_updated_event
 from ...utils.create_utils import create_version
 from ...utils.prompt_utils import prompts_update_version
 from ...utils.publish_utils import fire_version_deleted_event
@@ -103,6 +104,7 @@ class PromptLibAPI(api_tools.APIModeHandler):
                     return {'error': 'You cannot delete latest prompt version'}, 400
                 session.delete(version)
                 session.commit()
+                fire_prompt_version_updated_event(project_id, version_id)
                 fire_version_deleted_event(project_id, version_data, prompt_data)
                 return '', 204
             return '', 404
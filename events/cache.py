@@ -0,0 +1,39 @@
+from pylon.core.tools import web
+
+from ..utils.ai_providers import AIProvider
+from ..utils.collection_cache import invalidate_collection_detail, invalidate_collection_detail_for_entity
+from ..utils.conversation import invalidate_prompt_version_snapshot
+from ..utils.tagged_entities import invalidate_tagged_entities
+
+
+class Event:
+    @web.event("prompt_lib_prompt_version_updated")
+    def handle_prompt_version_updated(self, context, event, payload: dict):
+        invalidate_prompt_version_snapshot(
+            project_id=payload['project_id'],
+            prompt_version_id=payload.get('prompt_version_id')
+        )
+        invalidate_collection_detail_for_entity(
+            'prompt', payload['project_id'], payload.get('prompt_id')
+        )
+        # version tags may have changed
+        invalidate_tagged_entities(payload['project_id'])
+
+    @web.event("prompt_lib_collection_detail_changed")
+    def handle_collection_detail_changed(self, context, event, payload: dict):
+        invalidate_collection_detail(payload['owner_id'], payload['id'])
+
+    @web.event("integration_updated")
+    def handle_integration_updated(self, context, event, payload: dict):
+        AIProvider.invalidate_integration(_get_integration_uid(payload))
+
+    @web.event("integration_deleted")
+    def handle_integration_deleted(self, context, event, payload: dict):
+        AIProvider.invalidate_integration(_get_integration_uid(payload))
+
+
+def _get_integration_uid(payload) -> str | None:
+    # unknown payload shape drops the whole cache
+    if isinstance(payload, dict):
+        return payload.get('uid') or payload.get('integration_uid')
+    return None
@@ -10,6 +10,8 @@ from ..models.pd.collections import (
     CollectionItem,
     CollectionPatchModel
 )
+from ..utils.collection_cache import invalidate_collection_detail
+from ..utils.collection_membership import sync_collection_membership
 from ..utils.collection_registry import (
     ENTITY_REG,
     get_entity_info_by_name
@@ -22,6 +24,7 @@ from ..utils.collections import (
     patch_collection_with_entities,
     remove_entity_from_collection,
 )
+from ..utils.fanout import fan_out
 from ..utils.publish_utils import get_public_project_id
 from ...promptlib_shared.models.enums.all import PublishStatus
 
@@ -39,6 +42,7 @@ class Event:
             collection_id=private_collection_id,
             status=status
         )
+        invalidate_collection_detail(private_project_id, private_collection_id)
 
     @web.event("prompt_lib_collection_updated")
     def handle_collection_updated(self, context, event, payload: dict):
@@ -50,39 +54,59 @@ class Event:
         entity_info = get_entity_info_by_name(payload['entity_name'])
         Entity = entity_info.get_entity_type()
 
-        # add collection to entities
-        grouped_added_entities: dict = group_by_project_id(added_entities, data_type="tuple")
-        for owner_id, ids in grouped_added_entities.items():
-            add_collection_to_entities(Entity, owner_id, ids, collection_data, context)
-
-        # remove collection from entities
-        grouped_removed_entities: dict = group_by_project_id(removed_entities, data_type="tuple")
-        for owner_id, ids in grouped_removed_entities.items():
-            delete_collection_from_entities(Entity, owner_id, ids, collection_data, context)
+        # add collection to added entities and remove it from removed ones
+        tasks = [
+            (add_collection_to_entities, project_id, ids)
+            for project_id, ids in group_by_project_id(added_entities, data_type="tuple").items()
+        ] + [
+            (delete_collection_from_entities, project_id, ids)
+            for project_id, ids in group_by_project_id(removed_entities, data_type="tuple").items()
+        ]
+        try:
+            # every project is processed before the first error is re-raised
+            fan_out(
+                lambda task: task[0](Entity, task[1], task[2], collection_data, context),
+                tasks
+            )
+        finally:
+            sync_collection_membership(collection_data['owner_id'], [collection_data['id']])
+            invalidate_collection_detail(collection_data['owner_id'], collection_data['id'])
 
     @web.event("prompt_lib_collection_deleted")
     def handle_collection_deleted(self, context, event, payload: dict):
         collection_data = payload
 
-        for ent in ENTITY_REG:
-            entities = group_by_project_id(collection_data[ent.entities_name])
-            for owner_id, ids in entities.items():
-                delete_collection_from_entities(
-                    ent.get_entity_type(),
-                    owner_id,
-                    ids,
-                    collection_data,
-                    context
-                )
+        tasks = [
+            (ent.get_entity_type(), owner_id, ids)
+            for ent in ENTITY_REG
+            for owner_id, ids in group_by_project_id(collection_data[ent.entities_name]).items()
+        ]
+        try:
+            # every project is processed before the first error is re-raised
+            fan_out(
+                lambda task: delete_collection_from_entities(*task, collection_data, context),
+                tasks
+            )
+        finally:
+            sync_collection_membership(collection_data['owner_id'], [collection_data['id']])
+            invalidate_collection_detail(collection_data['owner_id'], collection_data['id'])
 
     @web.event("prompt_lib_collection_added")
     def handle_collection_added(self, context, event, payload: dict):
         collection_data = payload
 
-        for ent in ENTITY_REG:
-            entities = group_by_project_id(collection_data[ent.entities_name])
-            for owner_id, ids in entities.items():
-                add_collection_to_entities(ent.get_entity_type(), owner_id, ids, collection_data, context)
+        tasks = [
+            (ent.get_entity_type(), owner_id, ids)
+            for ent in ENTITY_REG
+            for owner_id, ids in group_by_project_id(collection_data[ent.entities_name]).items()
+        ]
+        try:
+            fan_out(
+                lambda task: add_collection_to_entities(*task, collection_data, context),
+                tasks
+            )
+        finally:
+            sync_collection_membership(collection_data['owner_id'], [collection_data['id']])
 
     @web.event('prompt_lib_entity_published')
     def handle_entity_publishing(self, context, event, payload: dict) -> None:
@@ -113,6 +137,7 @@ class Event:
                 return
             collection.status = PublishStatus.draft
             session.commit()
+        invalidate_collection_detail(private_owner_id, private_id)
 
 
 def delete_collection_from_entities(entity_type, owner_id: int, ids: list, collection_data: dict, context):
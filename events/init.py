@@ -4,6 +4,12 @@ from queue import Empty
 from pylon.core.tools import log, web
 from tools import VaultClient
 
+from ..utils.like_utils import LIKES_RECONCILER
+from ..utils.model_registry import MODEL_REGISTRY
+from ..utils.tenant_setup import TENANT_SETUP
+# modules registering tenant setup steps
+from ..utils import collection_membership, full_text, like_utils, search_stats  # noqa: F401
+
 applications_roles = [
     "models.applications.applications.list",
     "models.applications.applications.create",
@@ -36,6 +42,15 @@ class Event:
         event_pylon_id = payload
         if self.context.id != event_pylon_id:
             return
+        # model classes of other plugins could have been reloaded
+        MODEL_REGISTRY.invalidate()
+        # indexes and backfills of existing tenants run in background, not in their first requests
+        try:
+            projects = self.context.rpc_manager.call.project_list(filter_={'create_success': True})
+            TENANT_SETUP.schedule_all(project['id'] for project in projects)
+        except Exception as e:
+            log.warning(f'Could not schedule tenant setup: {e}')
+        LIKES_RECONCILER.start()
         #
         if self.descriptor.config.get("auto_setup", False):
             log.info("Performing post-init setup checks")
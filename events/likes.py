@@ -0,0 +1,41 @@
+from pylon.core.tools import log, web
+
+from ..utils.collection_cache import invalidate_collection_detail, invalidate_collection_detail_for_entity
+from ..utils.leaderboard import TRENDING_AUTHORS
+from ..utils.like_utils import refresh_likes_buckets, refresh_likes_counters
+from ...promptlib_shared.utils.exceptions import EntityNotAvailableCollectionError
+
+
+class Event:
+    @web.event("prompt_lib_like_changed")
+    def handle_like_changed(self, context, event, payload: dict):
+        try:
+            refresh_likes_counters(
+                project_id=payload['project_id'],
+                entity_name=payload['entity'],
+                entity_ids=[payload['entity_id']]
+            )
+            refresh_likes_buckets(
+                project_id=payload['project_id'],
+                entity_name=payload['entity'],
+                entity_ids=[payload['entity_id']]
+            )
+        except Exception as e:
+            log.error(f'Failed to refresh likes counter for {payload}: {e}')
+        #
+        try:
+            TRENDING_AUTHORS.apply_like(
+                payload['project_id'], payload['entity'], payload['entity_id'], payload['liked']
+            )
+        except Exception as e:
+            log.error(f'Failed to update trending authors for {payload}: {e}')
+        #
+        try:
+            if payload['entity'] == 'collection':
+                invalidate_collection_detail(payload['project_id'], payload['entity_id'])
+            else:
+                invalidate_collection_detail_for_entity(
+                    payload['entity'], payload['project_id'], payload['entity_id']
+                )
+        except EntityNotAvailableCollectionError:
+            pass
@@ -5,12 +5,15 @@ from copy import deepcopy
 from ..models.all import Collection, Prompt, PromptVersion
 from ..models.pd.prompt import PromptDetailModel
 from ..models.enums.events import PromptEvents
+from ..utils.conversation import fire_prompt_version_updated_event
 from ..utils.publish_utils import (
     close_private_version,
     delete_public_version,
     set_status
 )
 
+from ..utils.collection_cache import invalidate_collection_detail
+from ..utils.collection_membership import sync_collection_membership
 from ..utils.collections import group_by_project_id, delete_entity_from_collections
 from ...promptlib_shared.models.enums.all import PublishStatus
 
@@ -34,8 +37,10 @@ class Event:
         with db.with_project_schema_session(int(public_id)) as session:
             shared_owner_id = prompt_data['owner_id']
             shared_id = version_data['id']
-            delete_public_version(shared_owner_id, shared_id, session)
-            return session.commit()
+            deleted_version_id = delete_public_version(shared_owner_id, shared_id, session)
+            session.commit()
+            if deleted_version_id:
+                fire_prompt_version_updated_event(int(public_id), deleted_version_id)
 
     @web.event(PromptEvents.prompt_deleted)
     def prompt_deleted_handler(self, context, event, payload: dict):
@@ -58,6 +63,9 @@ class Event:
                     session=session
                 )
                 session.commit()
+            sync_collection_membership(owner_id, collection_ids)
+            for collection_id in collection_ids:
+                invalidate_collection_detail(owner_id, collection_id)
 
         if is_public:
             prompt_owner_id = prompt_data['shared_owner_id']
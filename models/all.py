@@ -4,7 +4,7 @@ from typing import List
 from tools import db_tools, db, config as c
 
 from .enums.all import PromptVersionType, MessageRoles
-from sqlalchemy import Integer, String, DateTime, func, ForeignKey, JSON, Table, Column, UniqueConstraint
+from sqlalchemy import Integer, String, DateTime, func, ForeignKey, JSON, Table, Column, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.mutable import MutableDict
@@ -136,11 +136,67 @@ class Collection(db_tools.AbstractBaseMixin, db.Base, AbstractLikesMixin):
     meta: Mapped[dict] = mapped_column(JSON, default=dict)
 
 
+class EntityLikesBucket(db_tools.AbstractBaseMixin, db.Base):
+    __tablename__ = "entity_likes_buckets"
+    __table_args__ = (
+        UniqueConstraint('entity', 'entity_id', 'bucket', name='_entity_likes_bucket_uc'),
+        Index('ix_entity_likes_buckets_bucket', 'entity', 'bucket'),
+        {"schema": c.POSTGRES_TENANT_SCHEMA},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(64), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    bucket: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    likes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class CollectionEntity(db_tools.AbstractBaseMixin, db.Base):
+    __tablename__ = "collection_entities"
+    __table_args__ = (
+        UniqueConstraint('collection_id', 'entity', 'entity_owner_id', 'entity_id', name='_collection_entity_uc'),
+        Index('ix_collection_entities_entity', 'entity', 'entity_owner_id', 'entity_id'),
+        {"schema": c.POSTGRES_TENANT_SCHEMA},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    collection_id: Mapped[int] = mapped_column(
+        ForeignKey(f'{c.POSTGRES_TENANT_SCHEMA}.{Collection.__tablename__}.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    entity: Mapped[str] = mapped_column(String(64), nullable=False)
+    entity_owner_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
 class SearchRequest(db_tools.AbstractBaseMixin, db.Base):
     __tablename__ = "search_requests"
     __table_args__ = (
+        Index('ix_search_requests_keyword', 'search_keyword', unique=True),
         {"schema": c.POSTGRES_TENANT_SCHEMA},
     )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     search_keyword: Mapped[str] = mapped_column(String, nullable=False)
     count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+
+class EntityLikes(db_tools.AbstractBaseMixin, db.Base):
+    __tablename__ = "entity_likes"
+    __table_args__ = (
+        UniqueConstraint('entity', 'entity_id', name='_entity_likes_uc'),
+        {"schema": c.POSTGRES_TENANT_SCHEMA},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(64), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    likes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, server_default=func.now(), onupdate=func.now())
+
+
+class TenantSetupStep(db_tools.AbstractBaseMixin, db.Base):
+    __tablename__ = "prompt_lib_setup_steps"
+    __table_args__ = (
+        UniqueConstraint('step', name='_prompt_lib_setup_step_uc'),
+        {"schema": c.POSTGRES_TENANT_SCHEMA},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    step: Mapped[str] = mapped_column(String(64), nullable=False)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
@@ -77,6 +77,15 @@ class Module(module.ModuleModel):
 
     def deinit(self):
         log.info('De-initializing')
+        #
+        from .utils.background import PREDICTION_PIPELINE
+        PREDICTION_PIPELINE.stop(timeout=30)
+        from .utils.search_stats import SEARCH_STATS
+        SEARCH_STATS.stop(timeout=30)
+        from .utils.like_utils import LIKES_RECONCILER
+        LIKES_RECONCILER.stop(timeout=30)
+        from .utils.tenant_setup import TENANT_SETUP
+        TENANT_SETUP.stop(timeout=30)
 
     # def init_db(self):
     #     log.info("DB init")
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from pylon.core.tools import web
+
+from ..utils.ai_providers import AIProvider
+from ..utils.author_profiles import AUTHOR_PROFILES
+from ..utils.background import PREDICTION_PIPELINE
+from ..utils.collection_cache import COLLECTION_DETAIL_CACHE
+from ..utils.conversation import PROMPT_VERSION_CACHE, TEMPLATE_CACHE
+from ..utils.like_utils import LIKES_RECONCILER
+from ..utils.model_registry import MODEL_REGISTRY
+from ..utils.search_stats import SEARCH_STATS
+from ..utils.suggest import SEARCH_SUGGESTIONS
+from ..utils.tagged_entities import TAGGED_ENTITIES_CACHE
+from ..utils.tenant_setup import TENANT_SETUP
+from ..utils.token_utils import MESSAGE_TOKENS_CACHE
+
+
+class RPC:
+    @web.rpc('prompt_lib_get_cache_stats', 'get_cache_stats')
+    def get_cache_stats(self, **kwargs) -> dict:
+        return {
+            'model_registry': MODEL_REGISTRY.stats(),
+            'templates': TEMPLATE_CACHE.stats(),
+            'prompt_versions': PROMPT_VERSION_CACHE.stats(),
+            'integrations': AIProvider.integration_cache.stats(),
+            'message_tokens': MESSAGE_TOKENS_CACHE.stats(),
+            'prediction_pipeline': PREDICTION_PIPELINE.stats(),
+            'collection_details': COLLECTION_DETAIL_CACHE.stats(),
+            'author_profiles': AUTHOR_PROFILES.cache.stats(),
+            'search_stats': SEARCH_STATS.stats(),
+            'tagged_entities': TAGGED_ENTITIES_CACHE.stats(),
+            'tenant_setup': TENANT_SETUP.stats(),
+            'likes_reconciler': LIKES_RECONCILER.stats(),
+        }
+
+    @web.rpc('prompt_lib_invalidate_model_registry', 'invalidate_model_registry')
+    def invalidate_model_registry(self, key: Optional[str] = None, **kwargs) -> None:
+        MODEL_REGISTRY.invalidate(key)
+
+    @web.rpc('prompt_lib_invalidate_integration', 'invalidate_integration')
+    def invalidate_integration(self, integration_uid: Optional[str] = None, **kwargs) -> None:
+        AIProvider.invalidate_integration(integration_uid)
+
+    @web.rpc('prompt_lib_invalidate_author_profiles', 'invalidate_author_profiles')
+    def invalidate_author_profiles(self, author_id: Optional[int] = None, **kwargs) -> None:
+        AUTHOR_PROFILES.invalidate(author_id)
+
+    @web.rpc('prompt_lib_invalidate_search_suggestions', 'invalidate_search_suggestions')
+    def invalidate_search_suggestions(self, project_id: Optional[int] = None, **kwargs) -> None:
+        SEARCH_SUGGESTIONS.invalidate(project_id)
@@ -24,13 +24,14 @@ from ..models.all import (
     Prompt,
     PromptVersion,
 )
-from ..utils.conversation import prepare_payload, prepare_conversation, CustomTemplateError, \
-    convert_messages_to_langchain
+from ..utils.conversation import prepare_payload, prepare_conversation, CustomTemplateError
 from ..utils.create_utils import create_prompt
 from ..utils.prompt_utils import set_icon_meta
-from ...promptlib_shared.utils.constants import PredictionEvents
 from ...promptlib_shared.utils.sio_utils import SioValidationError, get_event_room, SioEvents
 from ..utils.export_import_utils import prompts_export
+from ..utils.token_utils import TokenAccountant
+from ..utils.background import PREDICTION_PIPELINE
+from ..utils.streaming import ChunkCoalescer
 
 
 class RPC:
@@ -235,6 +236,22 @@ class RPC:
         #
         from tools import worker_client  # pylint: disable=E0401,C0415
         #
+        accountant = TokenAccountant(worker_client, payload.integration.name, payload)
+        result_tokens = accountant.stream_counter()
+        #
+        coalescer = ChunkCoalescer.from_config(
+            self.descriptor.config,
+            emit=lambda chunk_data: self.context.sio.emit(
+                event=sio_event,
+                data=chunk_data,
+                room=room,
+            ),
+            stream_id=payload.stream_id,
+            message_id=payload.message_id,
+            extra={'message_type': PromptVersionType.freeform}
+            if payload.type == PromptVersionType.freeform else None,
+        )
+        #
         try:
             token_limit, max_tokens = self.get_limits_from_payload(payload)  # pylint: disable=E1101
             conversation = worker_client.limit_tokens(
@@ -249,26 +266,14 @@ class RPC:
                 messages=conversation,
             ):
                 full_result += chunk["content"]
-                #
-                chunk_data = {
-                    "type": "AIMessageChunk",
-                    "content": chunk["content"],
-                    "response_metadata": {},
-                }
-                #
-                chunk_data['stream_id'] = payload.stream_id
-                chunk_data['message_id'] = payload.message_id
-                #
-                if payload.type == PromptVersionType.freeform:
-                    chunk_data['message_type'] = PromptVersionType.freeform
-                #
-                self.context.sio.emit(
-                    event=sio_event,
-                    data=chunk_data,
-                    room=room,
-                )
+                result_tokens.feed(chunk["content"])
+                coalescer.feed(chunk["content"])
+            #
+            coalescer.close()
         except BaseException as exception:  # pylint: disable=W0718
             log.debug("Predict exception: %s", traceback.format_exc())
+            # content streamed before the failure goes out first
+            coalescer.close()
             #
             exception_info = str(exception)
             #
@@ -316,20 +321,6 @@ class RPC:
         else:
             current_user = auth.current_user()
         #
-        tokens_in = worker_client.ai_count_tokens(
-            integration_name=payload.integration.name,
-            settings=payload,
-            data=full_result,
-        )
-        #
-        tokens_out = worker_client.ai_count_tokens(
-            integration_name=payload.integration.name,
-            settings=payload,
-            data=conversation,
-        )
-        #
-        conversation = convert_messages_to_langchain(conversation)
-        #
         event_payload = {
             'pylon': str(self.context.id),
             'project_id': payload.project_id,
@@ -339,19 +330,18 @@ class RPC:
             'entity_type': 'prompt',
             'entity_id': payload.prompt_id,
             'entity_meta': {'version_id': payload.prompt_version_id, 'prediction_type': payload.type},
-            'chat_history': [i.dict() for i in conversation],
             'predict_response': full_result,
             'model_settings': payload.merged_settings,
-            'tokens_in': tokens_in,
-            'tokens_out': tokens_out,
             'interaction_uuid': payload.interaction_uuid,
             'message_id': payload.message_id
         }
-        #
-        self.context.event_manager.fire_event(
-            PredictionEvents.prediction_done,
-            json.loads(json.dumps(event_payload))
-        )
+        # token counting, history conversion and prediction_done run in background
+        PREDICTION_PIPELINE.submit({
+            'event_payload': event_payload,
+            'conversation': conversation,
+            'accountant': accountant,
+            'result_tokens': result_tokens,
+        })
 
         return {"result": event_payload["predict_response"]}
 
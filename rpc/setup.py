@@ -0,0 +1,12 @@
+from typing import List
+
+from pylon.core.tools import web
+
+from ..utils.tenant_setup import TENANT_SETUP
+
+
+class RPC:
+    @web.rpc('prompt_lib_setup_tenant', 'setup_tenant')
+    def setup_tenant(self, project_id: int, **kwargs) -> List[str]:
+        """ Run tenant setup steps of the project now, e.g. from a migration, returns failed steps """
+        return TENANT_SETUP.setup(project_id)
@@ -3,6 +3,9 @@ from typing import Optional
 from tools import rpc_tools
 from pylon.core.tools import log
 
+from .cache import LRUCache
+from .constants import INTEGRATION_CACHE_SIZE, INTEGRATION_CACHE_TTL
+
 
 class IntegrationNotFound(Exception):
     "Raised when integration is not found"
@@ -10,6 +13,7 @@ class IntegrationNotFound(Exception):
 
 class AIProvider:
     rpc = rpc_tools.RpcMixin().rpc.call
+    integration_cache = LRUCache(maxsize=INTEGRATION_CACHE_SIZE, ttl=INTEGRATION_CACHE_TTL)
 
     @classmethod
     def get_integration_settings(
@@ -26,6 +30,10 @@ class AIProvider:
 
     @classmethod
     def get_integration(cls, project_id: int, integration_uid: str):
+        key = (project_id, integration_uid)
+        integration = cls.integration_cache.get(key)
+        if integration is not None:
+            return integration
         integration = cls.rpc.integrations_get_by_uid(
             integration_uid=integration_uid,
             project_id=project_id,
@@ -35,8 +43,17 @@ class AIProvider:
             raise IntegrationNotFound(
                 f"Integration is not found when project_id={project_id}, integration_uid={integration_uid}"
             )
+        cls.integration_cache.set(key, integration)
         return integration
 
+    @classmethod
+    def invalidate_integration(cls, integration_uid: Optional[str] = None) -> None:
+        """ Integration may be resolved from any project, so drop it for every project_id """
+        if integration_uid is None:
+            cls.integration_cache.clear()
+        else:
+            cls.integration_cache.invalidate(lambda key: key[1] == integration_uid)
+
     @classmethod
     def _get_rpc_function(cls, integration_name, suffix="__predict"):
         rpc_name = integration_name + suffix
@@ -0,0 +1,108 @@
+from queue import Empty
+from typing import Dict, Iterable, List, Optional
+
+from flask import g, has_app_context
+
+from pylon.core.tools import log
+from tools import auth, rpc_tools
+
+from .cache import LRUCache
+from .constants import AUTHOR_PROFILES_CACHE_SIZE, AUTHOR_PROFILES_CACHE_TTL
+
+
+class AuthorProfileResolver:
+    """
+    Resolves author profiles in bulk: one auth.list_users and one social_get_users
+    call for all ids missing from the request memo and the process-wide TTL cache
+    """
+
+    def __init__(self, maxsize: int = AUTHOR_PROFILES_CACHE_SIZE, ttl: float = AUTHOR_PROFILES_CACHE_TTL):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _request_memo() -> Optional[dict]:
+        if not has_app_context():
+            return None
+        if not hasattr(g, 'prompt_lib_authors'):
+            g.prompt_lib_authors = {}
+        return g.prompt_lib_authors
+
+    def _lookup(self, key, memo: Optional[dict]):
+        if memo is not None and key in memo:
+            return memo[key]
+        value = self.cache.get(key)
+        if value is not None and memo is not None:
+            memo[key] = value
+        return value
+
+    def _store(self, key, value, memo: Optional[dict]) -> None:
+        self.cache.set(key, value)
+        if memo is not None:
+            memo[key] = value
+
+    def get_many(self, author_ids: Iterable[int]) -> Dict[int, dict]:
+        """ Profiles of found users by id, each with social avatar """
+        memo = self._request_memo()
+        result = {}
+        missing = []
+        for author_id in dict.fromkeys(author_ids):
+            if author_id is None:
+                continue
+            profile = self._lookup(('profile', author_id), memo)
+            if profile is None:
+                missing.append(author_id)
+            else:
+                result[author_id] = profile
+
+        if missing:
+            try:
+                users_data: list = auth.list_users(user_ids=missing)
+            except RuntimeError:
+                users_data = []
+            try:
+                social_data: list = rpc_tools.RpcMixin().rpc.timeout(2).social_get_users(missing)
+            except (Empty, KeyError):
+                social_data = []
+            avatars = {row['user_id']: row.get('avatar') for row in social_data}
+
+            for user in users_data:
+                user['avatar'] = avatars.get(user['id'])
+                self._store(('profile', user['id']), user, memo)
+                result[user['id']] = user
+
+        # copies, callers are free to mutate returned data
+        return {author_id: dict(profile) for author_id, profile in result.items()}
+
+    def get_list(self, author_ids: Iterable[int]) -> List[dict]:
+        author_ids = list(author_ids)
+        profiles = self.get_many(author_ids)
+        return [profiles[i] for i in dict.fromkeys(author_ids) if i in profiles]
+
+    def get_detail(self, author_id: int) -> dict:
+        """ Single user merged with full social profile, e.g. title and description """
+        memo = self._request_memo()
+        key = ('detail', author_id)
+        detail = self._lookup(key, memo)
+        if detail is None:
+            try:
+                author_data = auth.get_user(user_id=author_id)
+            except RuntimeError:
+                return {}
+            try:
+                detail = rpc_tools.RpcMixin().rpc.timeout(2).social_get_user(author_data['id'])
+            except (Empty, KeyError):
+                detail = {}
+            detail.update(author_data)
+            self._store(key, detail, memo)
+        return dict(detail)
+
+    def invalidate(self, author_id: Optional[int] = None) -> None:
+        if author_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(('profile', author_id))
+            self.cache.pop(('detail', author_id))
+        log.debug(f'Author profiles invalidated: {author_id or "all"}')
+
+
+AUTHOR_PROFILES = AuthorProfileResolver()
@@ -0,0 +1,141 @@
+import json
+from queue import Queue, Full
+from threading import Thread, Lock
+from time import monotonic
+from typing import Any, Callable, List, Optional
+
+from pylon.core.tools import log
+from tools import rpc_tools
+
+from .conversation import convert_messages_to_langchain
+from .constants import (
+    PREDICTION_PIPELINE_QUEUE_SIZE,
+    PREDICTION_PIPELINE_WORKERS,
+)
+from ...promptlib_shared.utils.constants import PredictionEvents
+
+
+_STOP = object()
+
+
+class BackgroundPipeline:
+    """
+    Bounded queue drained one item at a time by a pool of daemon workers, it moves
+    work out of the request, not batches it. When the queue is full the item is
+    dropped and logged, so a request never waits for the pipeline or runs its work inline
+
+    :param name: worker thread name prefix
+    :param handler: callable processing one item
+    :param maxsize: queue capacity
+    :param workers: number of worker threads
+    """
+
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[Any], None],
+            maxsize: int = 1000,
+            workers: int = 1,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(workers, 1)
+        self._queue: Queue = Queue(maxsize=maxsize)
+        self._workers: List[Thread] = []
+        self._lock = Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_workers(self) -> None:
+        if len(self._workers) == self.workers and all(w.is_alive() for w in self._workers):
+            return
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < self.workers:
+                worker = Thread(target=self._run, name=f'{self.name}_{len(self._workers)}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, item: Any) -> None:
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            log.warning(f'{self.name} queue is full, item dropped ({dropped} dropped so far)')
+
+    def _handle(self, item: Any) -> None:
+        try:
+            self.handler(item)
+            with self._lock:
+                self.processed += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.exception(f'{self.name} failed to handle item: {e}')
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._handle(item)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Handle everything queued so far and stop the workers, waits at most timeout seconds """
+        workers = [w for w in self._workers if w.is_alive()]
+        if not workers:
+            return
+        deadline = monotonic() + timeout if timeout is not None else None
+
+        def remaining():
+            return None if deadline is None else max(deadline - monotonic(), 0)
+
+        for _ in workers:
+            try:
+                self._queue.put(_STOP, timeout=remaining())
+            except Full:
+                log.warning(f'{self.name} queue is still full, {self._queue.qsize()} items are dropped on exit')
+                return
+        for worker in workers:
+            worker.join(remaining())
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'maxsize': self._queue.maxsize,
+            'workers': self.workers,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+def handle_prediction_done(item: dict) -> None:
+    """
+    Finish bookkeeping of a streamed prediction: count tokens, convert chat history
+    and fire prediction_done, listeners expect one event per prediction
+    """
+    event_payload = item['event_payload']
+    conversation = item['conversation']
+    accountant = item['accountant']
+    event_payload['tokens_in'] = item['result_tokens'].total()
+    event_payload['tokens_out'] = accountant.conversation_tokens(conversation)
+    event_payload['chat_history'] = [
+        i.dict() for i in convert_messages_to_langchain(conversation)
+    ]
+    rpc_tools.EventManagerMixin().event_manager.fire_event(
+        PredictionEvents.prediction_done,
+        json.loads(json.dumps(event_payload))
+    )
+
+
+PREDICTION_PIPELINE = BackgroundPipeline(
+    name='prompt_lib_prediction_done',
+    handler=handle_prediction_done,
+    maxsize=PREDICTION_PIPELINE_QUEUE_SIZE,
+    workers=PREDICTION_PIPELINE_WORKERS,
+)
@@ -0,0 +1,192 @@
+import copy
+from collections import defaultdict
+from queue import Empty
+from threading import Lock
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from flask import has_request_context, request
+from sqlalchemy import and_, or_
+
+from pylon.core.tools import log
+from tools import auth, db, rpc_tools
+
+from .cache import LRUCache
+from .collection_registry import ENTITY_REG, get_entity_info_by_name
+from .constants import COLLECTION_DETAIL_CACHE_SIZE, COLLECTION_DETAIL_CACHE_TTL, COLLECTION_DETAIL_REFS_LIMIT
+from .fanout import is_request_partial
+from .model_registry import get_like_model
+
+
+# request args that change the rendered detail, my_liked depends on the user and is never cached
+COLLECTION_DETAIL_ARGS = (
+    'offset', 'limit', 'sort_by', 'sort_order', 'tags', 'query',
+    'author_id', 'statuses', 'trending_period',
+)
+# response sections whose rows have per-user is_liked
+_ROWS_SECTIONS = {ent.entities_name: ent.entities_name for ent in ENTITY_REG}
+_ROWS_SECTIONS['pipelines'] = 'applications'
+
+COLLECTION_DETAIL_CACHE = LRUCache(COLLECTION_DETAIL_CACHE_SIZE, ttl=COLLECTION_DETAIL_CACHE_TTL)
+# (entity name, owner id, entity id) -> collections (owner id, id) whose cached detail shows the entity
+_entity_refs: Dict[Tuple[str, int, int], Set[Tuple[int, int]]] = defaultdict(set)
+_refs_lock = Lock()
+_MISSING = object()
+
+
+def _get_cache_key(collection, only_public: bool) -> Optional[tuple]:
+    args = request.args if has_request_context() else {}
+    if args.get('my_liked'):
+        return None
+    return (
+        collection.owner_id,
+        collection.id,
+        str(collection.status),
+        only_public,
+        tuple(args.get(name) for name in COLLECTION_DETAIL_ARGS),
+    )
+
+
+def _strip_user_fields(detail: dict) -> Tuple[dict, frozenset]:
+    """
+    Copy of detail without is_liked fields and where they were: 'detail' for the collection itself,
+    e.g. only on public detail model, and names of sections whose rows had them
+    """
+    detail = copy.deepcopy(detail)
+    user_fields = set()
+    if detail.pop('is_liked', _MISSING) is not _MISSING:
+        user_fields.add('detail')
+    for section in _ROWS_SECTIONS:
+        for row in detail.get(section, {}).get('rows', []):
+            if row.pop('is_liked', _MISSING) is not _MISSING:
+                user_fields.add(section)
+    return detail, frozenset(user_fields)
+
+
+def _prune_refs() -> None:
+    """ Drop references of collections whose details were evicted or expired, called under _refs_lock """
+    cached = {(key[0], key[1]) for key in COLLECTION_DETAIL_CACHE.keys()}
+    for ref in list(_entity_refs):
+        collections = _entity_refs[ref] & cached
+        if collections:
+            _entity_refs[ref] = collections
+        else:
+            del _entity_refs[ref]
+    if len(_entity_refs) > COLLECTION_DETAIL_REFS_LIMIT:
+        # cached collections alone exceed the limit, details without references can not be kept
+        _entity_refs.clear()
+        COLLECTION_DETAIL_CACHE.clear()
+
+
+def _register_refs(collection) -> None:
+    collection_ref = (collection.owner_id, collection.id)
+    with _refs_lock:
+        for ent in ENTITY_REG:
+            for entity in ent.get_entities_field(collection) or []:
+                _entity_refs[(ent.entity_name, int(entity['owner_id']), int(entity['id']))].add(collection_ref)
+        if len(_entity_refs) > COLLECTION_DETAIL_REFS_LIMIT:
+            _prune_refs()
+
+
+def _overlay_user_fields(detail: dict, user_fields: frozenset, collection) -> dict:
+    """ Put is_liked of the current user on top of a shared cached detail, only where the render had it """
+    if 'detail' in user_fields:
+        try:
+            detail['is_liked'] = rpc_tools.RpcMixin().rpc.timeout(2).social_is_liked(
+                project_id=collection.owner_id, entity='collection', entity_id=collection.id
+            )
+        except Empty:
+            detail['is_liked'] = False
+
+    Like = get_like_model()
+    conditions = []
+    likes_entities = {}
+    for section, entities_name in _ROWS_SECTIONS.items():
+        rows = detail.get(section, {}).get('rows', [])
+        if not rows or section not in user_fields:
+            continue
+        likes_entity = get_entity_info_by_name(entities_name).get_entity_type().likes_entity_name
+        likes_entities[section] = likes_entity
+        owners = defaultdict(set)
+        for row in rows:
+            owners[row.get('owner_id', collection.owner_id)].add(row['id'])
+        for owner_id, ids in owners.items():
+            conditions.append(and_(
+                Like.entity == likes_entity,
+                Like.project_id == owner_id,
+                Like.entity_id.in_(ids)
+            ))
+    if not conditions:
+        return detail
+
+    with db.with_project_schema_session(collection.owner_id) as session:
+        liked = set(
+            session.query(Like.entity, Like.project_id, Like.entity_id)
+            .filter(Like.user_id == auth.current_user().get('id'), or_(*conditions))
+            .distinct()
+            .all()
+        )
+    for section, likes_entity in likes_entities.items():
+        for row in detail[section]['rows']:
+            owner_id = row.get('owner_id', collection.owner_id)
+            row['is_liked'] = (likes_entity, owner_id, row['id']) in liked
+    return detail
+
+
+def get_cached_collection_detail(collection, only_public: bool, render: Callable[[], dict]) -> dict:
+    """
+    Rendered collection detail shared between users, is_liked fields are
+    computed for the current user on every call
+    """
+    key = _get_cache_key(collection, only_public)
+    if key is None:
+        return render()
+
+    shared = COLLECTION_DETAIL_CACHE.get(key)
+    if shared is None:
+        detail = render()
+        # rows of projects that timed out or failed must not stay hidden for the whole ttl
+        if not is_request_partial():
+            _register_refs(collection)
+            COLLECTION_DETAIL_CACHE.set(key, _strip_user_fields(detail))
+        return detail
+
+    shared_detail, user_fields = shared
+    return _overlay_user_fields(copy.deepcopy(shared_detail), user_fields, collection)
+
+
+def invalidate_collection_detail(project_id: int, collection_id: Optional[int] = None) -> int:
+    dropped = COLLECTION_DETAIL_CACHE.invalidate(
+        lambda key: key[0] == project_id and (collection_id is None or key[1] == collection_id)
+    )
+    if dropped:
+        log.debug(f'Collection detail cache dropped {dropped} entries of {project_id=} {collection_id=}')
+    return dropped
+
+
+def invalidate_collection_detail_for_entity(
+        entity_name: str,
+        owner_id: int,
+        entity_id: Optional[int] = None
+) -> None:
+    """ Drop cached details of collections showing the entity, every entity of owner if entity_id is None """
+    entity_name = get_entity_info_by_name(entity_name).entity_name
+    with _refs_lock:
+        refs = [
+            ref for ref in _entity_refs
+            if ref[0] == entity_name and ref[1] == owner_id and (entity_id is None or ref[2] == entity_id)
+        ]
+        collections = set()
+        for ref in refs:
+            collections.update(_entity_refs.pop(ref))
+    for project_id, collection_id in collections:
+        invalidate_collection_detail(project_id, collection_id)
+
+
+def fire_collection_detail_changed_event(project_id: int, collection_id: int) -> None:
+    invalidate_collection_detail(project_id, collection_id)
+    rpc_tools.EventManagerMixin().event_manager.fire_event(
+        'prompt_lib_collection_detail_changed', {
+            'owner_id': project_id,
+            'id': collection_id,
+        }
+    )
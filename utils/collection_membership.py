@@ -0,0 +1,127 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import Integer, column, false, func, or_, select, true
+from sqlalchemy.dialects.postgresql import JSONB, insert
+
+from tools import db
+
+from .collection_registry import ENTITY_REG, get_entity_info_by_name
+from .tagged_entities import id_in
+from .tenant_setup import TENANT_SETUP
+from ..models.all import Collection, CollectionEntity
+
+
+def sync_collection_membership(project_id: int, collection_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Rebuild collection_entities rows from entity lists stored in collections.
+    Rows of collections that do not exist anymore are dropped
+
+    :param project_id: collections owner project
+    :param collection_ids: rebuild only these collections, all collections of project if None
+    :return:
+    """
+    with db.with_project_schema_session(project_id) as session:
+        query = session.query(Collection)
+        delete_query = session.query(CollectionEntity)
+        if collection_ids is not None:
+            collection_ids = set(collection_ids)
+            if not collection_ids:
+                return
+            query = query.filter(Collection.id.in_(collection_ids))
+            delete_query = delete_query.filter(CollectionEntity.collection_id.in_(collection_ids))
+
+        rows = []
+        for collection in query.all():
+            for ent in ENTITY_REG:
+                for entity in ent.get_entities_field(collection) or []:
+                    rows.append({
+                        'collection_id': collection.id,
+                        'entity': ent.entity_name,
+                        'entity_owner_id': int(entity['owner_id']),
+                        'entity_id': int(entity['id']),
+                    })
+
+        delete_query.delete(synchronize_session=False)
+        if rows:
+            session.execute(
+                insert(CollectionEntity).values(rows).on_conflict_do_nothing(
+                    constraint='_collection_entity_uc'
+                )
+            )
+        session.commit()
+
+
+@TENANT_SETUP.step('collection_membership')
+def build_collection_membership(project_id: int) -> None:
+    """ Index collections created before the table existed, later changes are synced by collection events """
+    sync_collection_membership(project_id)
+
+
+def _stored_entities(entity_info):
+    """ Rows of entity list stored in collections, one jsonb value per entity """
+    return (
+        func.jsonb_array_elements(entity_info.get_entities_field(Collection))
+        .table_valued(column('value', JSONB))
+    )
+
+
+def collection_entity_ids(project_id: int, entity_name: str, collection_ids=None):
+    """
+    Select of ids of project_id own entities included in its collections
+
+    :param project_id: owner of both collections and entities
+    :param entity_name: entity name or entities name, e.g. prompt or prompts
+    :param collection_ids: restrict to these collections, list or select of ids
+    :return:
+    """
+    entity_info = get_entity_info_by_name(entity_name)
+    if not TENANT_SETUP.is_ready(project_id, 'collection_membership'):
+        # entity lists stored in collections until membership table is built
+        entities = _stored_entities(entity_info)
+        query = (
+            select(entities.c.value['id'].astext.cast(Integer))
+            .select_from(Collection)
+            .join(entities, true())
+            .where(entities.c.value['owner_id'].astext.cast(Integer) == project_id)
+        )
+        if collection_ids is not None:
+            query = query.where(Collection.id.in_(collection_ids))
+        return query
+    query = select(CollectionEntity.entity_id).where(
+        CollectionEntity.entity == entity_info.entity_name,
+        CollectionEntity.entity_owner_id == project_id,
+    )
+    if collection_ids is not None:
+        query = query.where(CollectionEntity.collection_id.in_(collection_ids))
+    return query
+
+
+def get_collections_with_entities_condition(
+        project_id: int,
+        entity_name: str,
+        entity_ids: Iterable[int],
+        entity_owner_id: Optional[int] = None
+):
+    """
+    Semi-join condition selecting collections of project_id containing any of the entities
+
+    :param project_id: collections owner project
+    :param entity_name: entity name or entities name, e.g. prompt or prompts
+    :param entity_ids: ids of entities
+    :param entity_owner_id: entities owner project, project_id if None
+    :return:
+    """
+    entity_info = get_entity_info_by_name(entity_name)
+    if not TENANT_SETUP.is_ready(project_id, 'collection_membership'):
+        field = entity_info.get_entities_field(Collection)
+        return or_(false(), *(
+            field.contains([{'owner_id': entity_owner_id or project_id, 'id': entity_id}])
+            for entity_id in entity_ids
+        ))
+    return Collection.id.in_(
+        select(CollectionEntity.collection_id).where(
+            CollectionEntity.entity == entity_info.entity_name,
+            CollectionEntity.entity_owner_id == (entity_owner_id or project_id),
+            id_in(CollectionEntity.entity_id, entity_ids),
+        )
+    )
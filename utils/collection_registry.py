@@ -4,6 +4,7 @@ from operator import attrgetter
 
 from pylon.core.tools import log
 from tools import rpc_tools
+from .model_registry import MODEL_REGISTRY
 from ...promptlib_shared.utils.exceptions import (
     EntityNotAvailableCollectionError,
 )
@@ -58,13 +59,25 @@ def _make_entity_registry():
                 ) from None
         return wrapper
 
+    def _registry_wrapper(rpc_fun, key):
+        """ Resolve model class once, later calls are served from MODEL_REGISTRY """
+
+        @wraps(rpc_fun)
+        def wrapper():
+            return MODEL_REGISTRY.get(key, rpc_fun)
+        return wrapper
+
     ret = []
     for entity_name, entities_name, model_rpc, version_rpc, export_rpc in _ENTITIES_INFO_IN:
         reg_dict = {
             "entity_name":  entity_name,
             "entities_name": entities_name,
-            "get_entity_type": _rpc_wrapper(model_rpc, entity_name),
-            "get_entity_version_type": _rpc_wrapper(version_rpc, entity_name),
+            "get_entity_type": _rpc_wrapper(
+                _registry_wrapper(model_rpc, f"{entity_name}_model"), entity_name
+            ),
+            "get_entity_version_type": _rpc_wrapper(
+                _registry_wrapper(version_rpc, f"{entity_name}_version_model"), entity_name
+            ),
             "get_entity_field": attrgetter(entity_name),
             "get_entities_field": attrgetter(entities_name),
             "entity_export": _rpc_wrapper(export_rpc, entity_name),
@@ -1,29 +1,34 @@
 import copy
+import heapq
 import json
 from collections import defaultdict
 from datetime import datetime
 from functools import partial
-from itertools import chain
+from itertools import chain, islice
 from typing import Dict, List, Optional, Union
 
 from flask import request
 from pydantic.v1 import ValidationError
-from sqlalchemy import and_, desc, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, asc, desc, func, literal, or_, select
 from sqlalchemy.sql import exists
 from werkzeug.datastructures import MultiDict
 
 from pylon.core.tools import log
 from tools import VaultClient, db, rpc_tools
 
+from .collection_cache import fire_collection_detail_changed_event, get_cached_collection_detail
+from .collection_membership import get_collections_with_entities_condition
 from .collection_registry import (
     ENTITY_REG,
     get_entity_info_by_name,
 )
 from .expceptions import NotFound
+from .fanout import fan_out
+from .full_text import search_condition, search_rank
 from .like_utils import add_likes, add_my_liked, add_trending_likes
 from .prompt_utils import set_columns_as_attrs
 from .publish_utils import get_public_project_id
+from .tagged_entities import get_tagged_entity_ids, id_in
 from .utils import get_author_data, get_authors_data
 from ..models.all import Collection
 from ..models.enums.all import CollectionPatchOperations
@@ -47,7 +52,7 @@ from ...promptlib_shared.utils.exceptions import (
     EntityInaccessableError,
     EntityNotInCollectionError,
 )
-from ...promptlib_shared.utils.utils import add_public_project_id, get_entities_by_tags
+from ...promptlib_shared.utils.utils import add_public_project_id
 
 
 def check_addability(owner_id: int, user_id: int):
@@ -59,22 +64,98 @@ def check_addability(owner_id: int, user_id: int):
     ) or membership_check(owner_id, user_id)
 
 
+COLLECTION_ENTITIES_SORT_FIELDS = ('created_at', 'name', 'id')
+
+
+def _merge_key(sort_value, project_id: int, entity_id: int, is_asc: bool) -> tuple:
+    # keys of every stream must be monotonic for heapq.merge: NULLs last, ties by id in sort direction
+    if is_asc:
+        return sort_value is None, sort_value, project_id, entity_id
+    return sort_value is not None, sort_value, project_id, entity_id
+
+
+def _build_collection_entity_query(
+        session,
+        project_id: int,
+        Entity,
+        EntityVersion,
+        ids,
+        filters: list,
+        only_public: bool,
+        trend_period,
+        my_liked,
+        sort_by_likes: bool,
+        tags: Optional[List[int]] = None):
+    """ Query of collection entities of one owner project with likes columns, returns query, extra columns and likes expression """
+    project_filters = list(filters)
+    if tags:
+        entity_ids = get_tagged_entity_ids(project_id, tags, Entity, EntityVersion)
+        project_filters.append(id_in(Entity.id, entity_ids))
+
+    entity_query = session.query(Entity).filter(Entity.id.in_(ids), *project_filters)
+    extra_columns = []
+    likes_expr = None
+
+    if only_public:
+        entity_query, new_columns = add_likes(
+            original_query=entity_query,
+            project_id=project_id,
+            entity=Entity,
+        )
+        extra_columns.extend(new_columns)
+        if sort_by_likes:
+            # likes count expression is the last added column
+            likes_expr = entity_query.column_descriptions[-1]['expr']
+
+        if trend_period:
+            entity_query, new_columns = add_trending_likes(
+                original_query=entity_query,
+                project_id=project_id,
+                entity=Entity,
+                trend_period=trend_period,
+                filter_results=True
+            )
+            extra_columns.extend(new_columns)
+
+        entity_query, new_columns = add_my_liked(
+            original_query=entity_query,
+            project_id=project_id,
+            entity=Entity,
+            filter_results=my_liked
+        )
+        extra_columns.extend(new_columns)
+
+    return entity_query, extra_columns, likes_expr
+
+
 def get_entities_for_collection(
         entity_type,
         entity_version_type,
         collection_entities: List[Dict[int, int]],
         only_public: bool = False,
-        extra_filter_params: Optional[Dict[str, str]] = None) -> list:
-
+        extra_filter_params: Optional[Dict[str, str]] = None,
+        split_by_agent_type: bool = False) -> Union[list, Dict[str, list]]:
+    """
+    Page of collection entities. Every owner project returns at most offset + limit
+    ordered (sort value, id) pairs, the pairs are merged and only entities of the
+    requested page are loaded and serialized.
+    With split_by_agent_type applications are fetched in one pass and returned as
+    {'agent': rows, 'pipeline': rows}, each partition paginated on its own
+    """
     Entity = entity_type
     EntityVersion = entity_version_type
 
-    entities = []
     filters = []
     offset = request.args.get("offset", 0, type=int)
     limit = request.args.get("limit", 0, type=int)
     trend_period = request.args.get("trending_period")
     my_liked = request.args.get('my_liked', False)
+    sort_by = request.args.get('sort_by', 'created_at')
+    sort_order = request.args.get('sort_order', 'desc')
+    is_asc = sort_order.lower() == 'asc'
+    sort_by_likes = sort_by == 'likes' and only_public
+    if not sort_by_likes and (sort_by not in COLLECTION_ENTITIES_SORT_FIELDS or not hasattr(Entity, sort_by)):
+        sort_by = 'id'
 
     if author_id := request.args.get('author_id'):
         filters.append(Entity.versions.any(EntityVersion.author_id == author_id))
@@ -108,69 +189,123 @@ def get_entities_for_collection(
             Entity.versions.any(EntityVersion.status == PublishStatus.published)
         )
 
-    grouped_entities = group_by_project_id(collection_entities)
-    for project_id, ids in grouped_entities.items():
-        with db.with_project_schema_session(project_id) as session:
-
-            if tags := request.args.get('tags'):
-                # Filtering parameters
-                if isinstance(tags, str):
-                    tags = [int(tag) for tag in tags.split(',')]
-                entities_subq = get_entities_by_tags(project_id, tags, Entity, EntityVersion)
-                filters.append(Entity.id.in_(entities_subq))
-
-            entity_query = session.query(Entity).filter(Entity.id.in_(ids), *filters)
-            extra_columns = []
-
-            if only_public:
-                entity_query, new_columns = add_likes(
-                    original_query=entity_query,
-                    project_id=project_id,
-                    entity=Entity,
-                )
-                extra_columns.extend(new_columns)
-
-                if trend_period:
-                    entity_query, new_columns = add_trending_likes(
-                        original_query=entity_query,
-                        project_id=project_id,
-                        entity=Entity,
-                        trend_period=trend_period,
-                        filter_results=True
-                    )
-                    extra_columns.extend(new_columns)
-
-                entity_query, new_columns = add_my_liked(
-                    original_query=entity_query,
-                    project_id=project_id,
-                    entity=Entity,
-                    filter_results=my_liked
-                )
-                extra_columns.extend(new_columns)
-
-            q_result = entity_query.all()
-            project_entities = list(set_columns_as_attrs(q_result, extra_columns))
+    # Filtering parameters
+    tags = request.args.get('tags')
+    if isinstance(tags, str):
+        tags = [int(tag) for tag in tags.split(',')]
+
+    query_kwargs = {
+        'tags': tags,
+        'Entity': Entity,
+        'EntityVersion': EntityVersion,
+        'filters': filters,
+        'only_public': only_public,
+        'trend_period': trend_period,
+        'my_liked': my_liked,
+        'sort_by_likes': sort_by_likes,
+    }
 
-            # user_map
-            author_ids = set()
-            for entity in project_entities:
-                # entity = entity[0] if only_public else entity
-                for version in entity.versions:
-                    author_ids.add(version.author_id)
-            users = get_authors_data(list(author_ids))
-            user_map = {user['id']: user for user in users}
+    if split_by_agent_type:
+        partitions = [AgentTypes.pipeline.value, 'agent']
+        is_pipeline = Entity.versions.any(EntityVersion.agent_type == AgentTypes.pipeline.value)
+    else:
+        partitions = [None]
+        is_pipeline = None
 
-            for entity in project_entities:
+    def get_project_keys(project_item) -> dict:
+        project_id, ids = project_item
+        with db.with_project_schema_session(project_id) as session:
+            entity_query, _, likes_expr = _build_collection_entity_query(
+                session, project_id, ids=ids, **query_kwargs
+            )
+            sort_column = likes_expr if sort_by_likes else getattr(Entity, sort_by)
+            if sort_by == 'name':
+                # byte order, so that database and python comparisons of the merge agree
+                sort_column = sort_column.collate('C')
+            sort_fn = asc if is_asc else desc
+            ordering = (sort_fn(sort_column).nulls_last(), sort_fn(Entity.id))
+
+            if is_pipeline is None:
+                keys_query = entity_query.with_entities(sort_column, Entity.id, literal(None)).order_by(*ordering)
+                if limit:
+                    keys_query = keys_query.limit(offset + limit)
+                rows = keys_query.all()
+            else:
+                # first offset + limit rows of each partition in one query
+                ranked = entity_query.with_entities(
+                    sort_column.label('sort_value'),
+                    Entity.id.label('entity_id'),
+                    is_pipeline.label('is_pipeline'),
+                    func.row_number().over(partition_by=is_pipeline, order_by=ordering).label('rn'),
+                ).subquery()
+                keys_query = session.query(ranked.c.sort_value, ranked.c.entity_id, ranked.c.is_pipeline)
+                if limit:
+                    keys_query = keys_query.filter(ranked.c.rn <= offset + limit)
+                rows = keys_query.all()
+
+        project_keys = defaultdict(list)
+        for sort_value, entity_id, pipeline in rows:
+            if is_pipeline is None:
+                partition = None
+            else:
+                partition = partitions[0] if pipeline else partitions[1]
+            project_keys[partition].append(_merge_key(sort_value, project_id, entity_id, is_asc))
+        for keys in project_keys.values():
+            keys.sort(reverse=not is_asc)
+        return project_keys
+
+    def get_project_page(project_item) -> list:
+        project_id, ids = project_item
+        with db.with_project_schema_session(project_id) as session:
+            entity_query, extra_columns, _ = _build_collection_entity_query(
+                session, project_id, ids=ids, **query_kwargs
+            )
+            page = []
+            for entity in set_columns_as_attrs(entity_query.all(), extra_columns):
+                entity_authors = {version.author_id for version in entity.versions}
                 if only_public:
-                    entity = PublishedEntityListModel.from_orm(entity)
+                    model = PublishedEntityListModel.from_orm(entity)
                 else:
-                    entity = EntityListModel.from_orm(entity)
-                entity.set_authors(user_map)
-                entities.append(json.loads(entity.json()))
-
-    if limit:
-        entities = entities[offset:limit + offset]
-    return entities
+                    model = EntityListModel.from_orm(entity)
+                page.append((project_id, entity.id, model, entity_authors))
+            return page
+
+    # ordered (sort value, id) streams per owner project
+    streams = fan_out(get_project_keys, group_by_project_id(collection_entities).items())
+
+    page_keys = {}
+    for partition in partitions:
+        merged = heapq.merge(*((stream or {}).get(partition, []) for stream in streams), reverse=not is_asc)
+        # offset applies only with limit, as before the merge
+        page_keys[partition] = list(islice(merged, offset, offset + limit) if limit else merged)
+
+    page_ids = defaultdict(list)
+    for *_, project_id, entity_id in chain.from_iterable(page_keys.values()):
+        page_ids[project_id].append(entity_id)
+
+    # materialize the page only
+    models = {}
+    author_ids = set()
+    for project_page in fan_out(get_project_page, page_ids.items()):
+        for project_id, entity_id, model, entity_authors in project_page or []:
+            models[(project_id, entity_id)] = model
+            author_ids.update(entity_authors)
+
+    user_map = {}
+    if author_ids:
+        user_map = {user['id']: user for user in get_authors_data(list(author_ids))}
+
+    result = {}
+    for partition, keys in page_keys.items():
+        entities = []
+        for *_, project_id, entity_id in keys:
+            entity = models.get((project_id, entity_id))
+            if entity is None:
+                continue
+            entity.set_authors(user_map)
+            entities.append(json.loads(entity.json()))
+        result[partition] = entities
+    return result if split_by_agent_type else result[None]
 
 
 def get_filter_collection_by_tags_condition(project_id: int, tags: List[int], session=None):
@@ -189,36 +324,23 @@ def get_filter_collection_by_tags_condition(project_id: int, tags: List[int], se
 
 
 def get_filter_collection_by_entity_tags_condition(project_id: int, tags: List[int], entity_name, session=None):
-    session_created = False
-    if session is None:
-        session = db.get_project_schema_session(project_id)
-        session_created = True
-
     entity_info = get_entity_info_by_name(entity_name)
 
     entity_filters = []
-    kwargs = {
-        'entity_type': entity_info.get_entity_type(),
-        'entity_version_type': entity_info.get_entity_version_type()
-    }
-    kwargs['session'] = session
-    kwargs['subquery'] = False
-
-    entity_ids = get_entities_by_tags(project_id, tags, **kwargs)
+    entity_ids = get_tagged_entity_ids(
+        project_id,
+        tags,
+        entity_info.get_entity_type(),
+        entity_info.get_entity_version_type(),
+        session=session
+    )
 
     if not entity_ids:
         return entity_filters
 
-    for id_ in entity_ids:
-        entity_value = {
-            "owner_id": project_id,
-            "id": id_
-        }
-        entity_filters.append(entity_info.get_entities_field(Collection).contains([entity_value]))
-
-    if session_created:
-        session.close()
-
+    entity_filters.append(
+        get_collections_with_entities_condition(project_id, entity_name, entity_ids)
+    )
     return entity_filters
 
 
@@ -321,18 +443,18 @@ def list_collections(
         extra_columns.extend(new_columns)
 
         if search:
-            query = query.filter(
-                or_(
-                    Collection.name.ilike(f"%{search}%"),
-                    Collection.description.ilike(f"%{search}%")
-                )
-            )
+            query = query.filter(search_condition(Collection, search))
 
         if filters:
             query = query.filter(*filters)
 
         # Apply sorting
-        if not trend_period and not sort_by_likes:
+        rank = search_rank(Collection, search) if search and sort_by == 'relevance' else None
+        if rank is not None:
+            query = query.order_by(desc(rank) if sort_order.lower() != 'asc' else rank, desc(Collection.id))
+        elif sort_by == 'relevance':
+            query = query.order_by(desc(Collection.created_at) if sort_order.lower() != 'asc' else Collection.created_at)
+        elif not trend_period and not sort_by_likes:
             if sort_order.lower() == "asc":
                 query = query.order_by(getattr(Collection, sort_by, sort_by))
             else:
@@ -391,6 +513,7 @@ def update_collection(project_id: int, collection_id: int, data: dict):
                 if hasattr(collection, field):
                     setattr(collection, field, value)
             session.commit()
+            fire_collection_detail_changed_event(project_id, collection_id)
 
             return get_detail_collection(collection)
         return None
@@ -399,7 +522,9 @@ def update_collection(project_id: int, collection_id: int, data: dict):
 def get_collection(project_id: int, collection_id: int, only_public: bool = False):
     with db.with_project_schema_session(project_id) as session:
         if collection := session.query(Collection).get(collection_id):
-            return get_detail_collection(collection, only_public)
+            return get_cached_collection_detail(
+                collection, only_public, lambda: get_detail_collection(collection, only_public)
+            )
         return None
 
 
@@ -433,16 +558,16 @@ def get_detail_collection(collection: Collection, only_public: bool = False):
         kwargs['only_public'] = only_public
 
         if entity_info.entities_name == 'applications':
-            kwargs['extra_filter_params'] = { "agent_type": "pipeline" }
-            pipeline_entity_rows = get_entities_for_collection(**kwargs)
+            # agents - all applications except pipelines, both partitions in one pass
+            kwargs['split_by_agent_type'] = True
+            split_rows = get_entities_for_collection(**kwargs)
+            pipeline_entity_rows = split_rows[AgentTypes.pipeline.value]
             result["pipelines"] = {
                 "total": len(pipeline_entity_rows), 
                 "rows": pipeline_entity_rows
             }
 
-            # agents - all applications except pipelines
-            kwargs['extra_filter_params'] = { "agent_type": "agent" }
-            agent_entity_rows = get_entities_for_collection(**kwargs)
+            agent_entity_rows = split_rows['agent']
             result[entity_info.entities_name] = {
                 "total": len(agent_entity_rows),
                 "rows": agent_entity_rows
@@ -840,37 +965,43 @@ def do_patch_collection(data: CollectionPatchModel, session, return_data):
     return None
 
 
-def get_collection_tags(collection) -> list:
-    tags = dict()
+def _get_entities_tags(ent, project_id: int, entity_ids: List[int]) -> List[TagBaseModel]:
+    """ Distinct tags of all versions of given entities in one query """
+    Entity = ent.get_entity_type()
+    EntityVersion = ent.get_entity_version_type()
+    Tag = EntityVersion.tags.property.mapper.class_
+    # version column referencing the entity, e.g. PromptVersion.prompt_id
+    (_, entity_id_column), = Entity.versions.property.local_remote_pairs
 
+    tag_ids = (
+        select(Tag.id)
+        .select_from(EntityVersion)
+        .join(EntityVersion.tags)
+        .where(entity_id_column.in_(entity_ids))
+    )
+    with db.with_project_schema_session(project_id) as session:
+        tags = session.query(Tag).filter(Tag.id.in_(tag_ids)).order_by(Tag.id).all()
+        return [TagBaseModel.from_orm(tag) for tag in tags]
+
+
+def get_collection_tags(collection) -> list:
+    tasks = []
     for ent in ENTITY_REG:
         entities = ent.get_entities_field(collection)
         if not entities:
             continue
-        Entity = ent.get_entity_type()
-        EntityVersion = ent.get_entity_version_type()
 
-        entities_data = defaultdict(list)
+        entities_data = defaultdict(set)
         for entity_data in entities:
-            entities_data[entity_data['owner_id']].append(entity_data['id'])
+            entities_data[entity_data['owner_id']].add(entity_data['id'])
 
         for project_id, entity_ids in entities_data.items():
-            with db.with_project_schema_session(project_id) as session:
-                for entity_id in entity_ids:
-                    query = (
-                        session.query(Entity)
-                        .options(
-                            joinedload(Entity.versions).joinedload(EntityVersion.tags)
-                        )
-                    )
-                    entity = query.get(entity_id)
-
-                    if not entity:
-                        continue
+            tasks.append((ent, project_id, list(entity_ids)))
 
-                    for version in entity.versions:
-                        for tag in version.tags:
-                            tags[tag.name] = TagBaseModel.from_orm(tag)
+    tags = dict()
+    for project_tags in fan_out(lambda task: _get_entities_tags(*task), tasks):
+        for tag in project_tags or []:
+            tags[tag.name] = tag
 
     return list(tags.values())
 
@@ -945,6 +1076,8 @@ class CollectionPublishing:
         finally:
             if session_created:
                 session.close()
+        # approve and reject go through here as well
+        fire_collection_detail_changed_event(project_id, collection_id)
 
         if return_updated:
             return collection
@@ -1 +1,35 @@
 PROMPT_LIB_MODE = 'prompt_lib'
+TEMPLATE_CACHE_SIZE = 1024
+PROMPT_VERSION_CACHE_SIZE = 512
+PROMPT_VERSION_CACHE_TTL = 300
+INTEGRATION_CACHE_SIZE = 256
+INTEGRATION_CACHE_TTL = 60
+MESSAGE_TOKENS_CACHE_SIZE = 8192
+STREAM_TOKENS_FLUSH_CHARS = 2048
+PREDICTION_PIPELINE_QUEUE_SIZE = 1000
+PREDICTION_PIPELINE_WORKERS = 4
+STREAM_EMIT_MAX_BYTES = 1024
+STREAM_EMIT_MAX_CHUNKS = 16
+STREAM_EMIT_INTERVAL = 0.03
+FANOUT_MAX_WORKERS = 8
+FANOUT_TIMEOUT = 30
+COLLECTION_DETAIL_CACHE_SIZE = 512
+COLLECTION_DETAIL_CACHE_TTL = 120
+COLLECTION_DETAIL_REFS_LIMIT = 100000
+AUTHOR_PROFILES_CACHE_SIZE = 4096
+AUTHOR_PROFILES_CACHE_TTL = 300
+TRENDING_AUTHORS_REFRESH_INTERVAL = 300
+LIKES_BUCKET = 'hour'
+LIKES_RECONCILE_INTERVAL = 900
+FULL_TEXT_SEARCH_CONFIG = 'simple'
+SEARCH_SECTIONS_TIMEOUT = 10
+SEARCH_SUGGEST_REFRESH_INTERVAL = 300
+SEARCH_SUGGEST_RECENCY_HALF_LIFE = 3600
+SEARCH_SUGGEST_PRECOMPUTED_PREFIX = 2
+SEARCH_SUGGEST_LIMIT = 10
+SEARCH_STATS_FLUSH_INTERVAL = 5
+SEARCH_STATS_MAX_PENDING = 1000
+SEARCH_STATS_MAX_BACKOFF = 300
+TAGGED_ENTITIES_CACHE_SIZE = 1024
+TAGGED_ENTITIES_CACHE_TTL = 30
+TENANT_SETUP_RETRY_INTERVAL = 300
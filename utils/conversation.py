@@ -1,20 +1,88 @@
-from typing import List
+from hashlib import sha256
+from threading import Lock
+from typing import List, Optional, Tuple
 
-from jinja2 import TemplateSyntaxError, Environment, DebugUndefined
+from jinja2 import TemplateSyntaxError, Environment, DebugUndefined, Template
 
 from sqlalchemy.orm import joinedload
+from .cache import LRUCache
+from .constants import TEMPLATE_CACHE_SIZE, PROMPT_VERSION_CACHE_SIZE, PROMPT_VERSION_CACHE_TTL
 from ..models.all import PromptVersion
 from ..models.enums.all import MessageRoles
 from ..models.pd.predict import PromptVersionPredictModel, PromptMessagePredictModel
-from tools import db
+from tools import db, rpc_tools
 from pylon.core.tools import log
 
 
+_environment = Environment(undefined=DebugUndefined)
+TEMPLATE_CACHE = LRUCache(maxsize=TEMPLATE_CACHE_SIZE)
+
+
+def _get_template(text: str) -> Template:
+    # syntax errors are raised by from_string and never get cached
+    key = sha256(text.encode()).hexdigest()
+    return TEMPLATE_CACHE.get_or_set(key, lambda: _environment.from_string(text))
+
+
 def _resolve_variables(text, vars) -> str:
-    environment = Environment(undefined=DebugUndefined)
-    ast = environment.parse(text)
-    template = environment.from_string(text)
-    return template.render(vars)
+    return _get_template(text).render(vars)
+
+
+PROMPT_VERSION_CACHE = LRUCache(maxsize=PROMPT_VERSION_CACHE_SIZE, ttl=PROMPT_VERSION_CACHE_TTL)
+# bumped on every invalidation so that a snapshot loaded concurrently with a change is not stored
+_prompt_version_cache_generation = 0
+_generation_lock = Lock()
+
+
+def _load_prompt_version_snapshot(project_id: int, prompt_version_id: int) -> Tuple[PromptVersionPredictModel, int]:
+    with db.get_session(project_id) as session:
+        prompt_version: PromptVersion = session.query(PromptVersion).options(
+            joinedload(PromptVersion.variables),
+            joinedload(PromptVersion.messages)
+        ).get(prompt_version_id)
+        prompt_version.project_id = project_id
+        prompt_version.prompt_version_id = prompt_version.id
+        return PromptVersionPredictModel.from_orm(prompt_version), prompt_version.prompt_id
+
+
+def get_prompt_version_snapshot(project_id: int, prompt_version_id: int) -> Tuple[PromptVersionPredictModel, int]:
+    """ Predict model of the stored prompt version and its prompt_id, served from cache when possible """
+    key = (project_id, prompt_version_id)
+    snapshot = PROMPT_VERSION_CACHE.get(key)
+    if snapshot is None:
+        with _generation_lock:
+            generation = _prompt_version_cache_generation
+        snapshot = _load_prompt_version_snapshot(project_id, prompt_version_id)
+        with _generation_lock:
+            if generation == _prompt_version_cache_generation:
+                PROMPT_VERSION_CACHE.set(key, snapshot)
+    return snapshot
+
+
+def invalidate_prompt_version_snapshot(project_id: int, prompt_version_id: Optional[int] = None) -> None:
+    global _prompt_version_cache_generation
+    with _generation_lock:
+        _prompt_version_cache_generation += 1
+        if prompt_version_id is None:
+            PROMPT_VERSION_CACHE.invalidate(lambda key: key[0] == project_id)
+        else:
+            PROMPT_VERSION_CACHE.pop((project_id, prompt_version_id))
+
+
+def fire_prompt_version_updated_event(
+        project_id: int,
+        prompt_version_id: Optional[int] = None,
+        prompt_id: Optional[int] = None
+) -> None:
+    """ Drop local snapshot and notify other pylons to drop theirs """
+    invalidate_prompt_version_snapshot(project_id, prompt_version_id)
+    rpc_tools.EventManagerMixin().event_manager.fire_event(
+        'prompt_lib_prompt_version_updated', {
+            'project_id': project_id,
+            'prompt_version_id': prompt_version_id,
+            'prompt_id': prompt_id,
+        }
+    )
 
 
 def prepare_payload(data: dict) -> PromptVersionPredictModel:
@@ -22,20 +90,13 @@ def prepare_payload(data: dict) -> PromptVersionPredictModel:
     payload = PromptVersionPredictModel.parse_obj(data)
     #
     if payload.prompt_version_id:
-        with db.get_session(payload.project_id) as session:
-            query_options = []
-            if not payload.variables:
-                query_options.append(joinedload(PromptVersion.variables))
-            if not payload.messages:
-                query_options.append(joinedload(PromptVersion.messages))
-            #
-            prompt_version: PromptVersion = session.query(PromptVersion).options(*query_options).get(payload.prompt_version_id)
-            prompt_version.project_id = payload.project_id
-            prompt_version.prompt_version_id = prompt_version.id
-            prompt_version_pd = PromptVersionPredictModel.from_orm(prompt_version)
-            payload = prompt_version_pd.merge_update(payload)
-            #
-            payload.prompt_id = prompt_version.prompt_id
+        prompt_version_pd, prompt_id = get_prompt_version_snapshot(
+            payload.project_id, payload.prompt_version_id
+        )
+        # merge_update builds a new model, cached snapshot stays untouched
+        payload = prompt_version_pd.merge_update(payload)
+        #
+        payload.prompt_id = prompt_id
     #
     log.debug(f'{payload=}')
     return payload
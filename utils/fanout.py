@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import local
+from time import monotonic
+from typing import Any, Callable, Iterable, List, Optional
+
+from flask import copy_current_request_context, g, has_app_context, has_request_context, request
+
+from pylon.core.tools import log
+from tools import db
+
+from .constants import FANOUT_MAX_WORKERS, FANOUT_TIMEOUT
+
+
+# environ is shared by copies of request context, workers flag the whole request
+_PARTIAL_KEY = 'prompt_lib.partial_results'
+
+# set in fan out worker threads, nested fan outs run inline instead of opening another pool
+_worker_state = local()
+
+
+class FanOutResult(list):
+    """ Results in order of items, failed keeps items that timed out or raised """
+
+    def __init__(self, results: Iterable[Any] = (), failed: Iterable[Any] = ()):
+        super().__init__(results)
+        self.failed = list(failed)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.failed)
+
+
+def is_request_partial() -> bool:
+    """ Whether any fan out of the current request returned defaults instead of results """
+    return has_request_context() and bool(request.environ.get(_PARTIAL_KEY))
+
+
+def _mark_request_partial() -> None:
+    if has_request_context():
+        request.environ[_PARTIAL_KEY] = True
+
+
+def _pool_workers_limit() -> Optional[int]:
+    """ Half of db connection pool, the rest stays for the calling request and other workers """
+    try:
+        return max(db.engine.pool.size() // 2, 1)
+    except Exception:
+        return None
+
+
+def _bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Request args and the current user stay available in worker threads.
+    A copied request context gets a fresh app context, so flask.g (g.auth included)
+    is carried over explicitly. Marks the thread as fan out worker while fn runs
+    """
+    g_data = dict(g.__dict__) if has_app_context() else {}
+
+    def with_g(*args, **kwargs):
+        if has_app_context():
+            for name, value in g_data.items():
+                setattr(g, name, value)
+        return fn(*args, **kwargs)
+
+    bound = copy_current_request_context(with_g) if has_request_context() else fn
+
+    def in_worker(*args, **kwargs):
+        _worker_state.active = True
+        try:
+            return bound(*args, **kwargs)
+        finally:
+            _worker_state.active = False
+
+    return in_worker
+
+
+def _run_inline(fn: Callable[..., Any], items: List[Any], default: Any, raise_errors: bool) -> FanOutResult:
+    results = []
+    failed = []
+    error = None
+    for item in items:
+        try:
+            results.append(fn(item))
+        except Exception as e:
+            log.exception(f'Fan out item {item} failed: {e}')
+            results.append(default)
+            failed.append(item)
+            if error is None:
+                error = e
+    if failed:
+        _mark_request_partial()
+    if error is not None and raise_errors:
+        raise error
+    return FanOutResult(results, failed)
+
+
+def fan_out(
+        fn: Callable[..., Any],
+        items: Iterable[Any],
+        max_workers: int = FANOUT_MAX_WORKERS,
+        timeout: Optional[float] = FANOUT_TIMEOUT,
+        default: Any = None,
+        raise_errors: bool = True,
+) -> FanOutResult:
+    """
+    Run fn(item) for every item concurrently, e.g. one tenant schema query per owner project.
+    Results keep order of items. Items which timed out or failed get default, are listed
+    in result.failed and mark the current request as partial.
+    Called from a fan out worker items run one by one, so pools never nest beyond max_workers.
+    A single item without timeout runs inline with the same error handling
+
+    :param fn: callable run for each item, usually opens its own project session
+    :param items: items to process, e.g. project ids or (project_id, ids) tuples
+    :param max_workers: max threads, further capped by db connection pool size
+    :param timeout: seconds to wait for all items, default is used for items that did not finish
+    :param default: result of timed out items and of failed items when errors are not raised
+    :param raise_errors: re-raise first item error once all items finished instead of logging it
+    :return: results in order of items
+    """
+    items = list(items)
+    if not items:
+        return FanOutResult()
+    if getattr(_worker_state, 'active', False) or (len(items) == 1 and timeout is None):
+        return _run_inline(fn, items, default, raise_errors)
+
+    workers = min(len(items), max_workers)
+    if pool_limit := _pool_workers_limit():
+        workers = min(workers, pool_limit)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prompt_lib_fan_out')
+    futures = [executor.submit(_bind_context(fn), item) for item in items]
+    deadline = None if timeout is None else monotonic() + timeout
+    results = []
+    failed = []
+    error = None
+    try:
+        for item, future in zip(items, futures):
+            try:
+                wait = None if deadline is None else max(0.0, deadline - monotonic())
+                results.append(future.result(timeout=wait))
+            except FutureTimeoutError:
+                log.warning(f'Fan out item {item} timed out after {timeout}s')
+                results.append(default)
+                failed.append(item)
+            except Exception as e:
+                log.exception(f'Fan out item {item} failed: {e}')
+                results.append(default)
+                failed.append(item)
+                if error is None:
+                    error = e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if failed:
+        _mark_request_partial()
+    if error is not None and raise_errors:
+        raise error
+    return FanOutResult(results, failed)
@@ -0,0 +1,85 @@
+import re
+
+from sqlalchemy import Index, func, literal_column, or_
+
+from .constants import FULL_TEXT_SEARCH_CONFIG
+from .tenant_setup import TENANT_SETUP, create_index_concurrently
+from ..models.all import Collection, Prompt
+
+
+SEARCH_WEIGHTS = (
+    ('name', 'A'),
+    ('description', 'B'),
+)
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def _literal(value: str):
+    # rendered inline so that queries match expression indexes
+    return literal_column("'{}'".format(value.replace("'", "''")))
+
+
+def _config():
+    return literal_column("'{}'::regconfig".format(FULL_TEXT_SEARCH_CONFIG))
+
+
+def search_vector(Model):
+    """ Weighted tsvector of name and description, whichever the model has """
+    vector = None
+    for field, weight in SEARCH_WEIGHTS:
+        column = getattr(Model, field, None)
+        if column is None:
+            continue
+        weighted = func.setweight(
+            func.to_tsvector(_config(), func.coalesce(column, _literal(''))),
+            _literal(weight)
+        )
+        vector = weighted if vector is None else vector.op('||')(weighted)
+    return vector
+
+
+def search_query(q: str):
+    """ tsquery matching all words of q as prefixes, e.g. summ finds summarize """
+    words = _word_re.findall(q.lower())
+    if not words:
+        return None
+    return func.to_tsquery(_config(), ' & '.join(f'{word}:*' for word in words))
+
+
+def search_condition(Model, q: str, fields=tuple(field for field, _ in SEARCH_WEIGHTS)):
+    """
+    Full text match for models with a search index, substring match of fields for the rest,
+    e.g. tags or models of other plugins, which would scan computing tsvector of every row
+
+    :param Model: searched model
+    :param q: search query
+    :param fields: fields matched with ilike when the model has no search index
+    """
+    tsquery = search_query(q) if Model in SEARCH_INDEXES else None
+    if tsquery is None:
+        return or_(*(
+            getattr(Model, field).ilike(f'%{q}%')
+            for field in fields if hasattr(Model, field)
+        ))
+    return search_vector(Model).op('@@')(tsquery)
+
+
+def search_rank(Model, q: str):
+    tsquery = search_query(q) if Model in SEARCH_INDEXES else None
+    if tsquery is None:
+        return None
+    return func.ts_rank_cd(search_vector(Model), tsquery)
+
+
+SEARCH_INDEXES = {
+    Model: Index(f'ix_{Model.__tablename__}_search', search_vector(Model), postgresql_using='gin')
+    for Model in (Prompt, Collection)
+}
+
+
+@TENANT_SETUP.step('search_indexes')
+def create_search_indexes(project_id: int) -> None:
+    """ Search indexes of tenants created before they were declared """
+    for index in SEARCH_INDEXES.values():
+        create_index_concurrently(project_id, index)
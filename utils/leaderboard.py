@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from pylon.core.tools import log
+from tools import db
+
+from .constants import TRENDING_AUTHORS_REFRESH_INTERVAL
+from .model_registry import get_like_model
+from ..models.all import PromptVersion
+
+
+LEADERBOARD_WINDOWS: Dict[str, Optional[timedelta]] = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'all': None,
+}
+
+
+class TrendingAuthorsLeaderboard:
+    """
+    Likes of prompts per author for every window, rebuilt with one query when older
+    than refresh_interval and adjusted on like events in between
+    """
+
+    def __init__(self, refresh_interval: float = TRENDING_AUTHORS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        # (project_id, entity_name) -> (built_at, {window: {author_id: likes}})
+        self._boards: Dict[Tuple[int, str], Tuple[float, Dict[str, Dict[int, int]]]] = {}
+        # guards boards dicts only, never held while querying db
+        self._lock = Lock()
+        # one rebuild per board at a time
+        self._build_locks: Dict[Tuple[int, str], Lock] = {}
+
+    @staticmethod
+    def _compute(project_id: int, entity_name: str) -> Dict[str, Dict[int, int]]:
+        Like = get_like_model()
+        now = datetime.utcnow()
+        with db.with_project_schema_session(project_id) as session:
+            counters = []
+            for window, period in LEADERBOARD_WINDOWS.items():
+                counter = func.count(Like.id)
+                if period is not None:
+                    counter = counter.filter(Like.created_at >= now - period)
+                counters.append(counter.label(window))
+            # likes of every prompt for all windows in one pass over likes
+            likes = (
+                session.query(Like.entity_id, *counters)
+                .filter(
+                    Like.project_id == project_id,
+                    Like.entity == entity_name
+                )
+                .group_by(Like.entity_id)
+                .subquery()
+            )
+            prompt_authors = (
+                session.query(PromptVersion.prompt_id, PromptVersion.author_id)
+                .distinct()
+                .subquery()
+            )
+            rows = (
+                session.query(
+                    prompt_authors.c.author_id,
+                    *(func.coalesce(func.sum(likes.c[window]), 0) for window in LEADERBOARD_WINDOWS)
+                )
+                # authors without likes stay on the board with 0
+                .outerjoin(likes, likes.c.entity_id == prompt_authors.c.prompt_id)
+                .group_by(prompt_authors.c.author_id)
+                .all()
+            )
+
+        boards = {window: {} for window in LEADERBOARD_WINDOWS}
+        for author_id, *window_likes in rows:
+            for window, value in zip(LEADERBOARD_WINDOWS, window_likes):
+                boards[window][author_id] = int(value)
+        return boards
+
+    def _get_board(self, project_id: int, entity_name: str) -> Dict[str, Dict[int, int]]:
+        key = (project_id, entity_name)
+        board = self._boards.get(key)
+        if board is not None and monotonic() - board[0] < self.refresh_interval:
+            return board[1]
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, Lock())
+        # readers keep the stale board while another thread rebuilds it
+        if not build_lock.acquire(blocking=board is None):
+            return board[1]
+        try:
+            board = self._boards.get(key)
+            if board is None or monotonic() - board[0] >= self.refresh_interval:
+                board = (monotonic(), self._compute(project_id, entity_name))
+                with self._lock:
+                    self._boards[key] = board
+        finally:
+            build_lock.release()
+        return board[1]
+
+    def get_top(
+            self,
+            project_id: int,
+            window: str = 'all',
+            limit: int = 5,
+            entity_name: str = 'prompt'
+    ) -> List[Tuple[int, int]]:
+        """ (author_id, likes) pairs ordered by likes """
+        board = self._get_board(project_id, entity_name)[window]
+        with self._lock:
+            items = list(board.items())
+        top = sorted(items, key=lambda item: (-item[1], item[0]))
+        return top[:limit]
+
+    def apply_like(
+            self,
+            project_id: int,
+            entity_name: str,
+            entity_id: int,
+            liked: bool,
+            created_at: Optional[datetime] = None
+    ) -> None:
+        """
+        Move authors of the liked prompt in already built boards. Only windows containing
+        the like are adjusted, a removed like of unknown age makes time windows rebuild
+
+        :param created_at: when the like was made, now for new likes
+        """
+        key = (project_id, entity_name)
+        if key not in self._boards:
+            return
+        if liked and created_at is None:
+            created_at = datetime.utcnow()
+        with db.with_project_schema_session(project_id) as session:
+            author_ids = [
+                row[0] for row in
+                session.query(PromptVersion.author_id)
+                .filter(PromptVersion.prompt_id == entity_id)
+                .distinct()
+                .all()
+            ]
+        delta = 1 if liked else -1
+        now = datetime.utcnow()
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                return
+            for window, period in LEADERBOARD_WINDOWS.items():
+                if period is not None:
+                    if created_at is None:
+                        # age of the removed like is unknown, rebuild on next read
+                        self._boards[key] = (float('-inf'), board[1])
+                        continue
+                    if created_at < now - period:
+                        continue
+                window_board = board[1][window]
+                for author_id in author_ids:
+                    window_board[author_id] = max(window_board.get(author_id, 0) + delta, 0)
+
+    def invalidate(self, project_id: Optional[int] = None) -> None:
+        with self._lock:
+            if project_id is None:
+                self._boards.clear()
+            else:
+                for key in [k for k in self._boards if k[0] == project_id]:
+                    del self._boards[key]
+        log.debug(f'Trending authors leaderboard invalidated: {project_id or "all"}')
+
+
+TRENDING_AUTHORS = TrendingAuthorsLeaderboard()
@@ -1,11 +1,220 @@
-from datetime import datetime
-from typing import Tuple, List, Optional
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Tuple, List, Optional, Iterable
 
 from flask_sqlalchemy.query import Query
-from sqlalchemy import Subquery, func, desc, asc
+from sqlalchemy import Subquery, func, desc, asc, literal, and_, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert
 
+from pylon.core.tools import log
 from tools import rpc_tools, db, auth
 
+from .constants import LIKES_BUCKET, LIKES_RECONCILE_INTERVAL
+from .model_registry import get_like_model
+from .tenant_setup import TENANT_SETUP
+from ..models.all import Collection, EntityLikes, EntityLikesBucket, Prompt
+
+
+LIKES_BUCKETS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+LIKES_ENTITY_NAMES = tuple(Model.likes_entity_name for Model in (Prompt, Collection))
+
+
+def refresh_likes_counters(
+        project_id: int,
+        entity_name: str,
+        entity_ids: Optional[Iterable[int]] = None
+) -> None:
+    """
+    Recount likes from social Like table into the entity_likes counter table.
+    Recounting instead of incrementing keeps the operation idempotent
+
+    :param project_id:
+    :param entity_name: likes entity name, e.g. prompt or collection
+    :param entity_ids: recount only these entities, whole entity type if None
+    :return:
+    """
+    Like = get_like_model()
+
+    with db.with_project_schema_session(project_id) as session:
+        query = (
+            session.query(Like.entity_id, func.count(Like.id))
+            .filter(
+                Like.entity == entity_name,
+                Like.project_id == project_id
+            )
+        )
+        if entity_ids is not None:
+            entity_ids = set(entity_ids)
+            if not entity_ids:
+                return
+            query = query.filter(Like.entity_id.in_(entity_ids))
+        counts = dict(query.group_by(Like.entity_id).all())
+
+        if entity_ids is None:
+            entity_ids = set(counts)
+            session.query(EntityLikes).filter(
+                EntityLikes.entity == entity_name,
+                EntityLikes.entity_id.not_in(entity_ids)
+            ).delete(synchronize_session=False)
+
+        if entity_ids:
+            stmt = insert(EntityLikes).values([
+                {'entity': entity_name, 'entity_id': i, 'likes': counts.get(i, 0)}
+                for i in entity_ids
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint='_entity_likes_uc',
+                set_={'likes': stmt.excluded.likes, 'updated_at': func.now()}
+            )
+            session.execute(stmt)
+        session.commit()
+
+
+@TENANT_SETUP.step('likes_counters')
+def build_likes_counters(project_id: int) -> None:
+    """ Count likes made before counters existed, later likes are counted by like events """
+    for entity_name in LIKES_ENTITY_NAMES:
+        refresh_likes_counters(project_id, entity_name)
+
+
+def _floor_bucket(value: datetime) -> datetime:
+    if LIKES_BUCKET == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def refresh_likes_buckets(
+        project_id: int,
+        entity_name: str,
+        entity_ids: Optional[Iterable[int]] = None,
+        since: Optional[datetime] = None
+) -> None:
+    """
+    Recount hourly likes rollup of entities from social Like table
+
+    :param project_id:
+    :param entity_name: likes entity name, e.g. prompt or collection
+    :param entity_ids: recount only these entities, whole entity type if None
+    :param since: recount only buckets starting at or after it, all buckets if None
+    :return:
+    """
+    Like = get_like_model()
+    bucket = func.date_trunc(LIKES_BUCKET, Like.created_at)
+
+    with db.with_project_schema_session(project_id) as session:
+        query = (
+            session.query(Like.entity_id, bucket, func.count(Like.id))
+            .filter(
+                Like.entity == entity_name,
+                Like.project_id == project_id
+            )
+        )
+        delete_query = session.query(EntityLikesBucket).filter(EntityLikesBucket.entity == entity_name)
+        if entity_ids is not None:
+            entity_ids = set(entity_ids)
+            if not entity_ids:
+                return
+            query = query.filter(Like.entity_id.in_(entity_ids))
+            delete_query = delete_query.filter(EntityLikesBucket.entity_id.in_(entity_ids))
+        if since is not None:
+            since = _floor_bucket(since)
+            query = query.filter(Like.created_at >= since)
+            delete_query = delete_query.filter(EntityLikesBucket.bucket >= since)
+        rows = query.group_by(Like.entity_id, bucket).all()
+
+        delete_query.delete(synchronize_session=False)
+        if rows:
+            session.execute(insert(EntityLikesBucket).values([
+                {'entity': entity_name, 'entity_id': entity_id, 'bucket': bucket_start, 'likes': likes}
+                for entity_id, bucket_start, likes in rows
+            ]).on_conflict_do_nothing(constraint='_entity_likes_bucket_uc'))
+        session.commit()
+
+
+@TENANT_SETUP.step('likes_buckets')
+def build_likes_buckets(project_id: int) -> None:
+    """ Roll up likes made before the rollup existed, later likes are added by like events """
+    for entity_name in LIKES_ENTITY_NAMES:
+        refresh_likes_buckets(project_id, entity_name)
+
+
+class LikesReconciler:
+    """
+    Recounts likes counters and recent rollup buckets of set up projects every interval seconds.
+    Like events keep them up to date between runs, but only for likes made through prompt_lib,
+    likes changed through social plugin directly are picked up here
+
+    :param interval: seconds between runs, buckets of the last two intervals are recounted
+    """
+
+    def __init__(self, interval: float = LIKES_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._lock = Lock()
+        self._stopped = Event()
+        self._worker: Optional[Thread] = None
+        self.runs = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped.clear()
+            self._worker = Thread(target=self._run, name='prompt_lib_likes_reconciler', daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.reconcile()
+
+    def reconcile(self) -> None:
+        since = datetime.utcnow() - timedelta(seconds=2 * self.interval)
+        buckets_ready = set(TENANT_SETUP.ready_projects('likes_buckets'))
+        for project_id in TENANT_SETUP.ready_projects('likes_counters'):
+            if self._stopped.is_set():
+                return
+            try:
+                for entity_name in LIKES_ENTITY_NAMES:
+                    refresh_likes_counters(project_id, entity_name)
+                    if project_id in buckets_ready:
+                        refresh_likes_buckets(project_id, entity_name, since=since)
+            except Exception as e:
+                self.failed += 1
+                log.error(f'Could not reconcile likes of project {project_id}: {e}')
+        self.runs += 1
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failed': self.failed,
+        }
+
+
+LIKES_RECONCILER = LikesReconciler()
+
+
+def fire_like_changed_event(project_id: int, entity_name: str, entity_id: int, user_id: int, liked: bool):
+    rpc_tools.EventManagerMixin().event_manager.fire_event(
+        'prompt_lib_like_changed', {
+            'project_id': project_id,
+            'entity': entity_name,
+            'entity_id': entity_id,
+            'user_id': user_id,
+            'liked': liked,
+        }
+    )
+
 
 def add_my_liked(
         original_query,
@@ -21,27 +230,26 @@ def add_my_liked(
     :param filter_results: will filter results with only liked by user
     :return:
     """
-    Like = rpc_tools.RpcMixin().rpc.timeout(2).social_get_like_model()
+    Like = get_like_model()
 
+    # liked set of the current user only, no aggregation over other users likes
     user_likes_subquery: Subquery = (
         db.session.query(
             Like.entity_id,
-            func.coalesce(func.bool_or(
-                Like.user_id == auth.current_user().get('id')), False
-            ).label('user_liked')
+            literal(True).label('user_liked')
         )
         .filter(
             Like.entity == entity.likes_entity_name,
             Like.project_id == project_id,
-            # Like.user_id == auth.current_user().get('id')
+            Like.user_id == auth.current_user().get('id')
         )
-        .group_by(Like.entity_id)
+        .distinct()
         .subquery()
     )
     mutated_query = (
         original_query
         .outerjoin(user_likes_subquery, user_likes_subquery.c.entity_id == entity.id)
-        .add_columns(user_likes_subquery.c.user_liked)
+        .add_columns(func.coalesce(user_likes_subquery.c.user_liked, False))
     )
     if filter_results:
         mutated_query = mutated_query.filter(user_likes_subquery.c.user_liked == True)
@@ -62,33 +270,40 @@ def add_likes(
         sort_order: str = 'desc'
 
 ) -> Tuple[Query, List[str]]:
-    Like = rpc_tools.RpcMixin().rpc.timeout(2).social_get_like_model()
-
-    likes_subquery: Subquery = (
-        db.session.query(
-            Like.entity_id,
-            func.count(Like.id).label('likes_count')
+    if TENANT_SETUP.is_ready(project_id, 'likes_counters'):
+        # maintained counters instead of aggregating the whole Like table
+        likes_counter = (
+            db.session.query(
+                EntityLikes.entity_id,
+                EntityLikes.likes.label('likes_count')
+            )
+            .filter(EntityLikes.entity == entity.likes_entity_name)
+            .subquery()
         )
-        .filter(
-            Like.entity == entity.likes_entity_name,
-            Like.project_id == project_id
+    else:
+        Like = get_like_model()
+        likes_counter = (
+            db.session.query(
+                Like.entity_id,
+                func.count(Like.id).label('likes_count')
+            )
+            .filter(
+                Like.entity == entity.likes_entity_name,
+                Like.project_id == project_id
+            )
+            .group_by(Like.entity_id)
+            .subquery()
         )
-        .group_by(Like.entity_id)
-        .subquery()
-    )
-    # if my_liked:
-    #     likes_subquery.filter(
-    #         Like.user_id == auth.current_user().get("id")
-    #     )
+    likes_count = func.coalesce(likes_counter.c.likes_count, 0)
 
     mutated_query = (
         original_query
-        .outerjoin(likes_subquery, likes_subquery.c.entity_id == entity.id)
-        .add_columns(func.coalesce(likes_subquery.c.likes_count, 0))
+        .outerjoin(likes_counter, likes_counter.c.entity_id == entity.id)
+        .add_columns(likes_count)
     )
     if sort_by_likes:
         sort_fn = desc if sort_order != "asc" else asc
-        mutated_query = mutated_query.order_by(sort_fn(func.coalesce(likes_subquery.c.likes_count, 0)))
+        mutated_query = mutated_query.order_by(sort_fn(likes_count))
 
     return mutated_query, ['likes']
 
@@ -109,21 +324,59 @@ def add_trending_likes(
     :param filter_results: if true will filter results with trending likes > 0
     :return:
     """
-    Like = rpc_tools.RpcMixin().rpc.timeout(2).social_get_like_model()
+    Like = get_like_model()
+    start, end = trend_period
 
-    trend_subquery = (
-        db.session.query(
-            Like.entity_id,
-            func.count(Like.id).label('trend_likes_count')
-        )
-        .filter(
+    raw_likes = (
+        select(Like.entity_id, func.count(Like.id).label('likes'))
+        .where(
             Like.entity == entity.likes_entity_name,
             Like.project_id == project_id,
-            Like.created_at.between(*trend_period),
         )
         .group_by(Like.entity_id)
-        .subquery()
     )
+    first_bucket = last_bucket = None
+    if isinstance(start, datetime) and isinstance(end, datetime):
+        first_bucket = _floor_bucket(start)
+        if first_bucket < start:
+            first_bucket += LIKES_BUCKETS[LIKES_BUCKET]
+        last_bucket = _floor_bucket(end)
+
+    if first_bucket is not None and first_bucket < last_bucket \
+            and TENANT_SETUP.is_ready(project_id, 'likes_buckets'):
+        # whole buckets from rollup, raw likes only at the window edges
+        bucket_likes = (
+            select(EntityLikesBucket.entity_id, EntityLikesBucket.likes)
+            .where(
+                EntityLikesBucket.entity == entity.likes_entity_name,
+                EntityLikesBucket.bucket >= first_bucket,
+                EntityLikesBucket.bucket < last_bucket,
+            )
+        )
+        edge_likes = raw_likes.where(or_(
+            and_(Like.created_at >= start, Like.created_at < first_bucket),
+            and_(Like.created_at >= last_bucket, Like.created_at <= end),
+        ))
+        window_likes = union_all(bucket_likes, edge_likes).subquery()
+        trend_subquery = (
+            select(
+                window_likes.c.entity_id,
+                func.sum(window_likes.c.likes).label('trend_likes_count')
+            )
+            .group_by(window_likes.c.entity_id)
+            .subquery()
+        )
+    else:
+        trend_subquery = (
+            select(Like.entity_id, func.count(Like.id).label('trend_likes_count'))
+            .where(
+                Like.entity == entity.likes_entity_name,
+                Like.project_id == project_id,
+                Like.created_at.between(start, end),
+            )
+            .group_by(Like.entity_id)
+            .subquery()
+        )
     # if my_liked:
     #     trend_subquery.filter(
     #         Like.user_id == auth.current_user().get("id")
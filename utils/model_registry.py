@@ -0,0 +1,66 @@
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from pylon.core.tools import log
+from tools import rpc_tools
+
+
+class ModelRegistry:
+    """ Process-local storage of model classes resolved from other plugins via rpc """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, resolver: Callable[[], Any]) -> Any:
+        try:
+            model = self._models[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return model
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                return self._models[key]
+            self.misses += 1
+            # resolver errors are propagated and nothing is stored
+            model = resolver()
+            if model is not None:
+                self._models[key] = model
+            return model
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._models.clear()
+            else:
+                self._models.pop(key, None)
+        log.debug(f'Model registry invalidated: {key or "all"}')
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._models),
+            'keys': sorted(self._models),
+        }
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_rpc_model(rpc_name: str, timeout: Optional[int] = None) -> Any:
+    """ Resolve model returned by rpc_name once and serve it from the registry afterwards """
+    def resolver():
+        rpc = rpc_tools.RpcMixin().rpc
+        rpc = rpc.timeout(timeout) if timeout else rpc.call
+        return getattr(rpc, rpc_name)()
+    return MODEL_REGISTRY.get(rpc_name, resolver)
+
+
+def get_like_model():
+    return get_rpc_model('social_get_like_model', timeout=2)
@@ -0,0 +1,119 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from typing import Any, Literal, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from pylon.core.tools import log
+
+
+CountMode = Literal['exact', 'approximate', 'none']
+COUNT_MODES = ('exact', 'approximate', 'none')
+
+
+class InvalidCursor(ValueError):
+    "Raised when pagination cursor can not be decoded"
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(sort_value: Any, entity_id: int) -> str:
+    """ Pack last seen (sort value, id) pair into an opaque url-safe token """
+    raw = json.dumps([_dump_value(sort_value), entity_id], separators=(',', ':'))
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, entity_id = json.loads(urlsafe_b64decode(padded.encode()))
+        return _load_value(sort_value), int(entity_id)
+    except (BinasciiError, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def keyset_condition(sort_column, id_column, sort_order: str, cursor_values: Tuple[Any, int]):
+    """
+    Condition selecting rows strictly after the cursor for ordering
+    (sort_column <sort_order>, id_column asc), postgres NULL placement included
+
+    :param sort_column: primary ordering expression, None when ordering by id only
+    :param id_column: unique tie-breaker column
+    :param sort_order: order of primary column
+    :param cursor_values: decoded (sort value, id) of the last row of previous page
+    :return:
+    """
+    sort_value, last_id = cursor_values
+    is_asc = sort_order.lower() == 'asc'
+
+    if sort_column is None:
+        return id_column > last_id if is_asc else id_column < last_id
+
+    # postgres puts NULLs last in ascending and first in descending order
+    if sort_value is None:
+        same_group = and_(sort_column.is_(None), id_column > last_id)
+        if is_asc:
+            return same_group
+        return or_(same_group, sort_column.isnot(None))
+
+    if is_asc:
+        return or_(
+            sort_column > sort_value,
+            and_(sort_column == sort_value, id_column > last_id),
+            sort_column.is_(None),
+        )
+    return or_(
+        sort_column < sort_value,
+        and_(sort_column == sort_value, id_column > last_id),
+    )
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+def estimate_count(session, query) -> Optional[int]:
+    """ Planner row estimate for the query, None if it could not be obtained """
+    try:
+        statement = query.enable_eagerloads(False).statement
+        # executed as a statement, not as driver sql, so that expanding IN parameters
+        # are rendered and tenant schema is translated like in the query itself
+        result = session.execute(_Explain(statement)).scalar()
+        if isinstance(result, str):
+            result = json.loads(result)
+        return int(result[0]['Plan']['Plan Rows'])
+    except Exception as e:
+        log.warning(f'Could not estimate query count: {e}')
+        return None
+
+
+def count_query(session, query, count_mode: CountMode = 'exact') -> Optional[int]:
+    if count_mode == 'none':
+        return None
+    if count_mode == 'approximate':
+        estimated = estimate_count(session, query)
+        if estimated is not None:
+            return estimated
+    return query.count()
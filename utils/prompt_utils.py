@@ -2,14 +2,18 @@ from json import loads
 from datetime import datetime
 from typing import List, Optional, Tuple, Dict, Literal, Generator
 from werkzeug.datastructures import MultiDict
-from sqlalchemy import cast, String, desc, or_, asc
+from sqlalchemy import cast, String, desc, asc
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
 
 from tools import db, auth, rpc_tools
 from pylon.core.tools import log
 
+from .conversation import fire_prompt_version_updated_event
+from .full_text import search_condition, search_rank
 from .like_utils import add_likes, add_trending_likes, add_my_liked
+from .tagged_entities import get_tagged_entity_ids, id_in
+from .pagination import CountMode, count_query, decode_cursor, encode_cursor, keyset_condition
 from ..models.all import Collection, Prompt, PromptVersion, PromptVariable, PromptMessage, \
     PromptVersionTagAssociation
 from ..models.pd.legacy.variable import VariableModel
@@ -19,7 +23,6 @@ from ..models.pd.prompt_version import PromptVersionDetailModel, PromptVersionUp
 from ..models.pd.tag import PromptTagListModel
 from ...promptlib_shared.models.all import Tag
 from ...promptlib_shared.models.enums.all import PublishStatus
-from ...promptlib_shared.utils.utils import get_entities_by_tags
 
 
 def create_variables_bulk(project_id: int, variables: List[dict], **kwargs) -> List[dict]:
@@ -144,6 +147,7 @@ def prompts_update_version(project_id: int, version_data: PromptVersionUpdateMod
             log.error(e)
             return {'updated': False, 'msg': 'Values you passed violates unique constraint'}
 
+        fire_prompt_version_updated_event(project_id, version.id, version.prompt_id)
         result = PromptVersionDetailModel.from_orm(version)
         return {'updated': True, 'data': loads(result.json())}
 
@@ -167,10 +171,23 @@ def list_prompts(project_id: int,
                  filters: Optional[list] = None,
                  with_likes: bool = True,
                  my_liked: bool = False,
-                 trend_period: Optional[Tuple[datetime, datetime]] = None
-                 ) -> Tuple[int, list]:
+                 trend_period: Optional[Tuple[datetime, datetime]] = None,
+                 cursor: Optional[str] = None,
+                 count_mode: CountMode = 'exact',
+                 search: Optional[str] = None,
+                 ) -> Tuple[Optional[int], list]:
+    """
+    Page of project prompts with likes and liked by current user columns
+
+    :param search: full text query ranking results for sort_by relevance
+    :param cursor: opaque token from previous page, replaces offset with keyset pagination
+    :param count_mode: exact - count(), approximate - planner estimate, none - skip total
+    :return: total and list of prompts
+    """
     if my_liked and not with_likes:
         my_liked = False
+    if sort_by == 'likes' and not with_likes:
+        sort_by = 'id'
 
     if filters is None:
         filters = []
@@ -192,6 +209,7 @@ def list_prompts(project_id: int,
             .options(joinedload(Prompt.versions).joinedload(PromptVersion.tags))
         )
         sort_by_likes = sort_by == "likes"
+        sort_column = None
         if with_likes:
             query, new_columns = add_likes(
                 original_query=query,
@@ -201,6 +219,9 @@ def list_prompts(project_id: int,
                 sort_order=sort_order
             )
             extra_columns.extend(new_columns)
+            if sort_by_likes:
+                # likes count expression is the last added column
+                sort_column = query.column_descriptions[-1]['expr']
 
         if trend_period:
             query, new_columns = add_trending_likes(
@@ -220,29 +241,44 @@ def list_prompts(project_id: int,
         )
         extra_columns.extend(new_columns)
 
+        if sort_by == 'relevance':
+            sort_column = search_rank(Prompt, search or '')
+            if sort_column is None:
+                sort_by = 'created_at'
+            else:
+                query = query.add_columns(sort_column.label('relevance'))
+                extra_columns.append('relevance')
+
         if filters:
             query = query.filter(*filters)
 
         # Apply sorting
-        if not sort_by_likes:
-            if sort_by != 'id':
-                sort_fn_primary = asc if sort_order.lower() == "asc" else desc
-                sort_fn_secondary = asc
-                # always ascending for the secondary unique field
-                query = query.order_by(
-                    sort_fn_primary(getattr(Prompt, sort_by)), sort_fn_secondary(Prompt.id)
-                )
-            else:
-                sort_fn = asc if sort_order.lower() == "asc" else desc
-                query = query.order_by(sort_fn(Prompt.id))
+        if sort_by_likes:
+            query = query.order_by(asc(Prompt.id))
+        elif sort_by != 'id':
+            if sort_column is None:
+                sort_column = getattr(Prompt, sort_by)
+            sort_fn_primary = asc if sort_order.lower() == "asc" else desc
+            sort_fn_secondary = asc
+            # always ascending for the secondary unique field
+            query = query.order_by(
+                sort_fn_primary(sort_column), sort_fn_secondary(Prompt.id)
+            )
+        else:
+            sort_fn = asc if sort_order.lower() == "asc" else desc
+            query = query.order_by(sort_fn(Prompt.id))
 
-        total = query.count()
+        total = count_query(session, query, count_mode)
 
         # Apply limit and offset for pagination
+        if cursor:
+            query = query.filter(
+                keyset_condition(sort_column, Prompt.id, sort_order, decode_cursor(cursor))
+            )
+        elif offset:
+            query = query.offset(offset)
         if limit:
             query = query.limit(limit)
-        if offset:
-            query = query.offset(offset)
 
         q_result: List[tuple[Prompt, int, bool, int]] = query.all()
 
@@ -352,14 +388,16 @@ def list_prompts_api(
         trend_end_period: str | None = None,
         with_likes: bool = True,
         collection: Optional[dict[str, int]] = None,
-        search_data: Optional[dict] = None
+        search_data: Optional[dict] = None,
+        cursor: Optional[str] = None,
+        count_mode: CountMode = 'exact',
 ):
     filters = []
     if tags:
         if isinstance(tags, str):
             tags = [int(tag) for tag in tags.split(',')]
-        prompts_subq = get_entities_by_tags(project_id, tags, Prompt, PromptVersion)
-        filters.append(Prompt.id.in_(prompts_subq))
+        prompt_ids = get_tagged_entity_ids(project_id, tags, Prompt, PromptVersion)
+        filters.append(id_in(Prompt.id, prompt_ids))
         # filters.append(Prompt.versions.any(PromptVersion.tags.any(Tag.id.in_(tags))))
 
     if author_id:
@@ -372,12 +410,9 @@ def list_prompts_api(
 
     # Search parameters
     if q:
-        filters.append(
-            or_(
-                Prompt.name.ilike(f"%{q}%"),
-                Prompt.description.ilike(f"%{q}%")
-            )
-        )
+        filters.append(search_condition(Prompt, q))
+    if sort_by == 'relevance' and (not q or search_rank(Prompt, q) is None):
+        sort_by = 'created_at'
 
     # if search_data:
     #     for keyword in search_data.get('keywords', []):
@@ -420,13 +455,28 @@ def list_prompts_api(
         trend_period=trend_period,
         with_likes=with_likes,
         filters=filters,
+        cursor=cursor,
+        count_mode=count_mode,
+        search=q,
     )
     if search_data:
         fire_searched_event(project_id, search_data)
 
+    next_cursor = None
+    if limit and prompts and len(prompts) == int(limit):
+        last_prompt = prompts[-1]
+        if sort_by == 'id' or (sort_by == 'likes' and not with_likes):
+            sort_value = None
+        elif sort_by == 'likes':
+            sort_value = last_prompt.likes
+        else:
+            sort_value = getattr(last_prompt, sort_by)
+        next_cursor = encode_cursor(sort_value, last_prompt.id)
+
     return {
         'total': total,
         'prompts': prompts,
+        'next_cursor': next_cursor,
     }
 
 
@@ -4,6 +4,7 @@ from pydantic.v1 import parse_obj_as
 from pylon.core.tools import web, log
 
 from ..models.pd.legacy.tag import PromptTagModel
+from .conversation import fire_prompt_version_updated_event
 from ..models.all import Prompt, PromptVersion, PromptVersionTagAssociation
 from ..models.pd.model_settings import ModelInfoCreateModel, ModelSettingsBaseModel
 from ..models.pd.prompt import PromptCreateModel, PromptUpdateModel
@@ -80,12 +81,16 @@ def prompts_update_prompt(project_id: int, prompt: dict, **kwargs) -> bool:
         session.query(Prompt).filter(Prompt.id == prompt_new_data.id).update(
             prompt_new_data.dict(exclude={'id', 'project_id'}, exclude_none=True)
         )
-        session.query(PromptVersion).filter(
+        versions_query = session.query(PromptVersion).filter(
             PromptVersion.prompt_id == prompt_new_data.id,
             PromptVersion.name == prompt_old_data['version']
-        ).update(version.dict(exclude_unset=True))
+        )
+        version_ids = [row[0] for row in versions_query.with_entities(PromptVersion.id).all()]
+        versions_query.update(version.dict(exclude_unset=True))
 
         session.commit()
+        for version_id in version_ids:
+            fire_prompt_version_updated_event(project_id, version_id, prompt_new_data.id)
         updated_prompt = session.query(Prompt).get(prompt_new_data.id)
         return updated_prompt.to_json()
 
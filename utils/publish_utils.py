@@ -6,6 +6,7 @@ from tools import db, VaultClient, auth, rpc_tools
 from pylon.core.tools import log
 
 from ..models.all import Prompt, PromptVersion
+from .conversation import fire_prompt_version_updated_event
 from .create_utils import create_version
 from ..models.pd.prompt_version import PromptVersionDetailModel, PromptVersionBaseModel
 from ...promptlib_shared.models.enums.all import PublishStatus, NotificationEventTypes
@@ -27,6 +28,7 @@ def set_status(project_id: int, prompt_version_name_or_id: int | str, status: Pu
                 }
             version.status = status
             session.commit()
+            fire_prompt_version_updated_event(project_id, version.id, version.prompt_id)
             if return_data:
                 version_detail = PromptVersionDetailModel.from_orm(version)
         except Exception as e:
@@ -244,6 +246,7 @@ def delete_public_version(shared_owner_id, shared_id, session):
     ).first()
     if version:
         session.delete(version)
+        return version.id
 
 
 def delete_public_prompt_versions(prompt_owner_id, prompt_id, session):
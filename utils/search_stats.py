@@ -0,0 +1,233 @@
+from collections import Counter
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from pylon.core.tools import log
+from tools import db
+
+from .constants import SEARCH_STATS_FLUSH_INTERVAL, SEARCH_STATS_MAX_BACKOFF, SEARCH_STATS_MAX_PENDING
+from .tenant_setup import TENANT_SETUP, create_index_concurrently
+from ..models.all import SearchRequest
+from ...promptlib_shared.models.all import Tag
+
+
+_KEYWORD_INDEX = next(i for i in SearchRequest.__table__.indexes if i.name == 'ix_search_requests_keyword')
+
+@TENANT_SETUP.step('search_keyword_index')
+def create_search_keyword_index(project_id: int) -> None:
+    """
+    Merge duplicate keywords of tenants created before search_keyword was unique
+    and create the unique index required by upserts
+    """
+    with db.with_project_schema_session(project_id) as session:
+        duplicates = (
+            session.query(
+                SearchRequest.search_keyword,
+                func.min(SearchRequest.id),
+                func.sum(SearchRequest.count)
+            )
+            .group_by(SearchRequest.search_keyword)
+            .having(func.count(SearchRequest.id) > 1)
+            .all()
+        )
+        for keyword, keep_id, total in duplicates:
+            session.query(SearchRequest).filter(
+                SearchRequest.search_keyword == keyword,
+                SearchRequest.id != keep_id
+            ).delete(synchronize_session=False)
+            session.query(SearchRequest).filter(
+                SearchRequest.id == keep_id
+            ).update({SearchRequest.count: total}, synchronize_session=False)
+        session.commit()
+    # stats writes wait for this step, so no duplicates appear before the index exists
+    create_index_concurrently(project_id, _KEYWORD_INDEX)
+
+
+class SearchStatsWriter:
+    """
+    Merges searched keywords and tags in memory and writes them every flush_interval
+    seconds with one upsert per project, or earlier when max_pending keywords piled up.
+    A project which failed to write is retried with exponential backoff up to max_backoff
+
+    :param flush_interval: seconds between flushes
+    :param max_pending: distinct pending keywords of a project triggering an early flush
+    :param max_backoff: max seconds between write attempts of a failing project
+    """
+
+    def __init__(
+            self,
+            flush_interval: float = SEARCH_STATS_FLUSH_INTERVAL,
+            max_pending: int = SEARCH_STATS_MAX_PENDING,
+            max_backoff: float = SEARCH_STATS_MAX_BACKOFF
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._keywords: Dict[int, Counter] = {}
+        # (tag ids, keywords) of searches with tags, names are resolved on flush
+        self._tag_searches: Dict[int, Counter] = {}
+        # project_id -> (failures in a row, next attempt at)
+        self._backoff: Dict[int, Tuple[int, float]] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._worker: Optional[Thread] = None
+        self.flushed = 0
+        self.failed = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = Thread(target=self._run, name='prompt_lib_search_stats', daemon=True)
+                self._worker.start()
+
+    def add(self, project_id: int, keywords: Iterable[str] = (), tag_ids: Iterable[int] = ()) -> None:
+        """ Count one search, every keyword and tag counts once per search """
+        self._ensure_worker()
+        keywords = frozenset(keywords)
+        tag_ids = frozenset(tag_ids)
+        with self._lock:
+            pending = self._keywords.setdefault(project_id, Counter())
+            pending.update(keywords)
+            if tag_ids:
+                self._tag_searches.setdefault(project_id, Counter())[(tag_ids, keywords)] += 1
+            if len(pending) >= self.max_pending:
+                self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _take(self):
+        with self._lock:
+            keywords, self._keywords = self._keywords, {}
+            tag_searches, self._tag_searches = self._tag_searches, {}
+        return keywords, tag_searches
+
+    def _restore(self, project_id: int, counts: Counter, tag_searches: Optional[Counter] = None) -> None:
+        # keep counts of failed flush for the next one
+        with self._lock:
+            self._keywords.setdefault(project_id, Counter()).update(counts)
+            if tag_searches:
+                self._tag_searches.setdefault(project_id, Counter()).update(tag_searches)
+
+    def _backing_off(self, project_id: int) -> bool:
+        backoff = self._backoff.get(project_id)
+        return backoff is not None and monotonic() < backoff[1]
+
+    def _record_failure(self, project_id: int, e: Exception) -> None:
+        self.failed += 1
+        failures = self._backoff.get(project_id, (0, 0))[0] + 1
+        delay = min(self.flush_interval * 2 ** failures, self.max_backoff)
+        self._backoff[project_id] = (failures, monotonic() + delay)
+        if failures == 1:
+            log.exception(f'Could not write search stats of project {project_id}: {e}')
+        else:
+            log.warning(f'Could not write search stats of project {project_id}, {failures} failures in a row, '
+                        f'next attempt in {delay}s: {e}')
+
+    def flush(self, force: bool = False) -> None:
+        with self._flush_lock:
+            keywords, tag_searches = self._take()
+            for project_id in set(keywords) | set(tag_searches):
+                counts = keywords.get(project_id, Counter())
+                indexed = TENANT_SETUP.is_ready(project_id, 'search_keyword_index')
+                if not force and (not indexed or self._backing_off(project_id)):
+                    # upserts need the unique index, counts wait for tenant setup or next attempt
+                    self._restore(project_id, counts, tag_searches.get(project_id))
+                    continue
+                try:
+                    counts = counts + self._tag_names(project_id, tag_searches.get(project_id))
+                    if indexed:
+                        self._write(project_id, counts)
+                    else:
+                        # last flush before stop, nothing would be left to wait for the index
+                        self._write_one_by_one(project_id, counts)
+                    self.flushed += sum(counts.values())
+                    self._backoff.pop(project_id, None)
+                except Exception as e:
+                    self._record_failure(project_id, e)
+                    if force:
+                        log.error(f'Dropped {sum(counts.values())} search stats counts of project {project_id}')
+                    else:
+                        self._restore(project_id, counts)
+
+    @staticmethod
+    def _tag_names(project_id: int, tag_searches: Optional[Counter]) -> Counter:
+        """ Tag names counted once per search, unless the name was searched as a keyword too """
+        if not tag_searches:
+            return Counter()
+        tag_ids = set().union(*(ids for ids, _ in tag_searches))
+        with db.with_project_schema_session(project_id) as session:
+            names = dict(session.query(Tag.id, Tag.name).filter(Tag.id.in_(tag_ids)).all())
+        counts = Counter()
+        for (ids, keywords), searches in tag_searches.items():
+            for name in {names[i] for i in ids if i in names} - keywords:
+                counts[name] += searches
+        return counts
+
+    @staticmethod
+    def _write(project_id: int, counts: Counter) -> None:
+        if not counts:
+            return
+        # sorted rows keep lock order stable between concurrent writers
+        rows = [{'search_keyword': k, 'count': n} for k, n in sorted(counts.items())]
+        stmt = insert(SearchRequest).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SearchRequest.search_keyword],
+            set_={'count': SearchRequest.count + stmt.excluded.count}
+        )
+        with db.with_project_schema_session(project_id) as session:
+            session.execute(stmt)
+            session.commit()
+
+    @staticmethod
+    def _write_one_by_one(project_id: int, counts: Counter) -> None:
+        """ Update or insert every keyword, for tenants without the unique index yet """
+        with db.with_project_schema_session(project_id) as session:
+            for keyword, count in sorted(counts.items()):
+                updated = session.query(SearchRequest).filter(
+                    SearchRequest.search_keyword == keyword
+                ).update({SearchRequest.count: SearchRequest.count + count}, synchronize_session=False)
+                if not updated:
+                    session.add(SearchRequest(search_keyword=keyword, count=count))
+            session.commit()
+
+    def pending(self, project_id: int) -> Counter:
+        """ Keyword counts of the project not written yet, a flush in progress is waited for """
+        with self._flush_lock, self._lock:
+            return Counter(self._keywords.get(project_id, ()))
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Stop the worker and write everything pending, projects still in tenant setup included """
+        self._stopped.set()
+        self._wakeup.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout)
+        self.flush(force=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(len(c) for c in self._keywords.values())
+            pending_tags = sum(len(c) for c in self._tag_searches.values())
+        return {
+            'pending_keywords': pending,
+            'pending_tag_searches': pending_tags,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'backing_off': len(self._backoff),
+        }
+
+
+SEARCH_STATS = SearchStatsWriter()
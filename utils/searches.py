@@ -1,6 +1,8 @@
 import json
+from functools import partial
+from time import perf_counter
 from flask import request
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from tools import db
 from pylon.core.tools import log
 from ..models.all import (
@@ -12,14 +14,16 @@ from ..models.all import (
 )
 from ..models.pd.collections import MultipleCollectionSearchModel
 from ..models.pd.misc import MultiplePromptTagListModel
-from sqlalchemy import desc, asc, or_, and_, func, distinct, not_
+from sqlalchemy import desc, asc, or_, and_, func, distinct, not_, true, select
 from tools import api_tools
 from flask import request
-from sqlalchemy.orm import joinedload
-from .expceptions import NotFound
+from .collection_membership import get_collections_with_entities_condition
 from .collections import get_filter_collection_by_entity_tags_condition
+from .constants import SEARCH_SECTIONS_TIMEOUT
+from .fanout import fan_out
+from .full_text import search_condition
+from .tagged_entities import get_tagged_entity_ids, id_in
 from ...promptlib_shared.models.all import Tag
-from ...promptlib_shared.utils.utils import get_entities_by_tags
 
 def list_search_requests(project_id, args):
     limit = args.get('limit', default=5, type=int)
@@ -38,7 +42,6 @@ def list_search_requests(project_id, args):
 
 def get_search_options(project_id, Model, PDModel, joinedload_, args_prefix, filters=None):
     query = request.args.get('query', '')
-    search_query = f"%{query}%"
 
     # filter_fields = ('name', 'title')
     # conditions = []
@@ -49,7 +52,8 @@ def get_search_options(project_id, Model, PDModel, joinedload_, args_prefix, fil
     #         )
     # or_(*conditions)
 
-    filter_ = and_(getattr(Model, 'name').ilike(search_query), *filters)
+    conditions = [search_condition(Model, query, fields=('name',))] if query else []
+    filter_ = and_(true(), *conditions, *filters)
     args_data = get_args(args_prefix)
     total, res = api_tools.get(
         project_id=project_id,
@@ -66,6 +70,37 @@ def get_search_options(project_id, Model, PDModel, joinedload_, args_prefix, fil
     }
 
 
+def run_search_sections(
+        sections: Dict[str, Callable[[], Any]],
+        timings: Optional[Dict[str, float]] = None,
+        timed_out: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Run search sections concurrently
+
+    :param sections: section name to callable producing its result
+    :param timings: filled with time spent by each section in ms
+    :param timed_out: filled with names of sections which did not finish in time
+    :return: results by section name, sections which did not finish in time are None
+    """
+    def run(item):
+        # timings are filled by the caller, workers left behind after timeout touch nothing shared
+        _, fn = item
+        started = perf_counter()
+        result = fn()
+        return result, round((perf_counter() - started) * 1000, 2)
+
+    started = perf_counter()
+    results = fan_out(run, sections.items(), timeout=SEARCH_SECTIONS_TIMEOUT, default=(None, None))
+    waited = round((perf_counter() - started) * 1000, 2)
+    if timed_out is not None:
+        timed_out.extend(name for name, _ in results.failed)
+    if timings is not None:
+        for name, (_, spent) in zip(sections, results):
+            timings[name] = waited if spent is None else spent
+    return {name: result for name, (result, _) in zip(sections, results)}
+
+
 def get_search_options_one_entity(
     project_id,
     entity_name,
@@ -73,7 +108,9 @@ def get_search_options_one_entity(
     ModelVersion,
     MultipleSearchModel,
     ModelVersionTagAssociation,
-    args_prefix=None
+    args_prefix=None,
+    timings: Optional[Dict[str, float]] = None,
+    timed_out: Optional[List[str]] = None
 ):
     result = {}
     entities = set(request.args.getlist('entities[]'))
@@ -107,20 +144,22 @@ def get_search_options_one_entity(
         }
     }
 
+    tagged_ids = None
     if tags:
-        try:
-            data = get_filter_collection_by_entity_tags_condition(project_id, tags, entity_name)
-            meta_data['collection']['filters'].append(or_(*data))
-        except NotFound:
-            entities = [entity for entity in entities if entity != "collection"]
+        tagged_ids = get_tagged_entity_ids(project_id, tags, Model, ModelVersion)
+        if tagged_ids:
+            meta_data['collection']['filters'].append(
+                get_collections_with_entities_condition(project_id, entity_name, tagged_ids)
+            )
+        else:
+            entities.discard('collection')
             result['collection'] = {
                 "total": 0,
                 "rows": []
             }
 
-        entities_subq = get_entities_by_tags(project_id, tags, Model, ModelVersion)
         meta_data[entity_name]['filters'].append(
-            Model.id.in_(entities_subq)
+            id_in(Model.id, tagged_ids)
         )
 
     # pipeline hardcode
@@ -162,15 +201,27 @@ def get_search_options_one_entity(
             author_id=author_id,
             statuses=statuses,
             tags=tags,
-
+            entity_ids=tagged_ids,
         )
     )
 
-    for section, data in meta_data.items():
-        if section in entities:
-            result[section] = get_search_options(project_id, **data)
+    sections = {
+        section: partial(get_search_options, project_id, **data)
+        for section, data in meta_data.items()
+        if section in entities
+    }
+    failed = []
+    for section, section_result in run_search_sections(sections, timings, failed).items():
+        result[section] = section_result or {"total": 0, "rows": []}
+    for section in failed:
+        # empty because it did not finish, not because nothing matched
+        result[section]['timed_out'] = True
 
     result[args_prefix] = result.pop(entity_name)
+    if timings is not None and entity_name in timings:
+        timings[args_prefix] = timings.pop(entity_name)
+    if timed_out is not None:
+        timed_out.extend(args_prefix if section == entity_name else section for section in failed)
 
     return result
 
@@ -184,16 +235,13 @@ def get_tag_filter(
         author_id: int = None,
         statuses: List[str] = None,
         tags: List[int] = None,
-        session=None
+        entity_ids: Optional[Iterable[int]] = None
 ):
-    if session is None:
-        session = db.get_project_schema_session(project_id)
-
-    entity_query = (
-        session.query(Model)
-        .options(joinedload(Model.versions))
-    )
+    """
+    Condition selecting tags of entities matching filters
 
+    :param entity_ids: already resolved ids of entities having tags, resolved here from tags if None
+    """
     filters = []
     if author_id:
         filters.append(Model.versions.any(ModelVersion.author_id == author_id))
@@ -202,22 +250,21 @@ def get_tag_filter(
         filters.append(Model.versions.any(ModelVersion.status.in_(statuses)))
 
     if tags:
-        entities_subq = get_entities_by_tags(project_id, tags, Model, ModelVersion, session)
+        if entity_ids is None:
+            entity_ids = get_tagged_entity_ids(project_id, tags, Model, ModelVersion)
         filters.append(
-            Model.id.in_(entities_subq)
+            id_in(Model.id, entity_ids)
         )
 
-    entity_query = entity_query.filter(*filters)
-    entity_query = entity_query.with_entities(Model.id)
-    entity_subquery = entity_query.subquery()
+    entity_subquery = select(Model.id).where(*filters)
 
     query = (
-        session.query(Tag.id)
-        .filter(getattr(ModelVersion, f'{entity_name}_id').in_(entity_subquery))
+        select(Tag.id)
         .join(ModelVersionTagAssociation, ModelVersionTagAssociation.c.tag_id == Tag.id)
         .join(ModelVersion, ModelVersion.id == ModelVersionTagAssociation.c.version_id)
+        .where(getattr(ModelVersion, f'{entity_name}_id').in_(entity_subquery))
         .group_by(Tag.id)
-    ).subquery()
+    )
     return Tag.id.in_(query)
 
 
@@ -0,0 +1,117 @@
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable, List, Optional
+
+from .constants import STREAM_EMIT_MAX_BYTES, STREAM_EMIT_MAX_CHUNKS, STREAM_EMIT_INTERVAL
+
+
+class ChunkCoalescer:
+    """
+    Joins streamed model chunks into fewer sio messages.
+    Buffered content is emitted once it reaches max_bytes or max_chunks,
+    or max_interval seconds after the first buffered chunk. The interval is checked
+    on chunk arrival, and one flusher thread per stream emits content a slow chunk
+    would hold back. close() emits the rest and stops the flusher
+
+    :param emit: callable receiving chunk data dict
+    :param stream_id: stream id put into every message
+    :param message_id: message id put into every message
+    :param extra: additional keys for every message, e.g. message_type
+    """
+
+    def __init__(
+            self,
+            emit: Callable[[dict], None],
+            stream_id: Optional[str],
+            message_id: Optional[str],
+            extra: Optional[dict] = None,
+            max_bytes: int = STREAM_EMIT_MAX_BYTES,
+            max_chunks: int = STREAM_EMIT_MAX_CHUNKS,
+            max_interval: float = STREAM_EMIT_INTERVAL,
+    ):
+        self.emit = emit
+        self.stream_id = stream_id
+        self.message_id = message_id
+        self.extra = extra or {}
+        self.max_bytes = max_bytes
+        self.max_chunks = max_chunks
+        self.max_interval = max_interval
+        self._parts: List[str] = []
+        self._size = 0
+        self._started_at: Optional[float] = None
+        # emits of the flusher and of the streaming thread keep chunk order
+        self._condition = Condition()
+        self._flusher: Optional[Thread] = None
+        self._closed = False
+        self.emitted = 0
+
+    def feed(self, content: str) -> None:
+        if not content:
+            return
+        with self._condition:
+            if self._flusher is None and not self._closed:
+                self._flusher = Thread(target=self._run_flusher, name='prompt_lib_stream_flusher', daemon=True)
+                self._flusher.start()
+            if not self._parts:
+                self._started_at = monotonic()
+                self._condition.notify()
+            self._parts.append(content)
+            self._size += len(content.encode())
+            if (
+                    self._size >= self.max_bytes
+                    or len(self._parts) >= self.max_chunks
+                    or monotonic() - self._started_at >= self.max_interval
+            ):
+                self._flush()
+
+    def _run_flusher(self) -> None:
+        with self._condition:
+            while not self._closed:
+                if not self._parts:
+                    self._condition.wait()
+                    continue
+                remaining = self._started_at + self.max_interval - monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._flush()
+
+    def flush(self) -> None:
+        with self._condition:
+            self._flush()
+
+    def close(self) -> None:
+        """ Emit what is buffered and stop the flusher """
+        with self._condition:
+            self._flush()
+            self._closed = True
+            self._condition.notify()
+
+    def _flush(self) -> None:
+        if not self._parts:
+            return
+        chunk_data = {
+            "type": "AIMessageChunk",
+            "content": ''.join(self._parts),
+            "response_metadata": {},
+            "stream_id": self.stream_id,
+            "message_id": self.message_id,
+            **self.extra,
+        }
+        self._parts = []
+        self._size = 0
+        self._started_at = None
+        self.emit(chunk_data)
+        self.emitted += 1
+
+    @classmethod
+    def from_config(cls, config: dict, emit: Callable[[dict], None], **kwargs) -> 'ChunkCoalescer':
+        """ Build coalescer with limits from plugin config section stream_emit """
+        settings = config.get('stream_emit', {})
+        return cls(
+            emit,
+            max_bytes=settings.get('max_bytes', STREAM_EMIT_MAX_BYTES),
+            max_chunks=settings.get('max_chunks', STREAM_EMIT_MAX_CHUNKS),
+            max_interval=settings.get('max_interval', STREAM_EMIT_INTERVAL),
+            **kwargs
+        )
@@ -0,0 +1,204 @@
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from math import expm1, log1p
+from threading import Lock, Thread
+from time import monotonic, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pylon.core.tools import log
+from tools import db
+
+from .constants import (
+    SEARCH_SUGGEST_LIMIT,
+    SEARCH_SUGGEST_PRECOMPUTED_PREFIX,
+    SEARCH_SUGGEST_RECENCY_HALF_LIFE,
+    SEARCH_SUGGEST_REFRESH_INTERVAL,
+)
+from .search_stats import SEARCH_STATS
+from ..models.all import SearchRequest
+from ...promptlib_shared.models.all import Tag
+
+
+class _ProjectSuggestions:
+    """
+    Immutable prefix index of one project: sorted (key, term) pairs searched with bisect,
+    keys are lowercased terms and every word start inside them
+    """
+
+    def __init__(self, terms: Dict[str, Tuple[str, float]], precomputed_prefix: int, limit: int):
+        # term -> (kind, weight)
+        self.terms = terms
+        keys = []
+        for term in terms:
+            lowered = term.lower()
+            words = lowered.split()
+            for i in range(len(words)):
+                keys.append((' '.join(words[i:]), term))
+        keys.sort()
+        self.keys = keys
+        self.limit = limit
+        # short prefixes match large ranges, their top terms are ranked at build time
+        self.top: Dict[str, List[str]] = {}
+        buckets: Dict[str, set] = {}
+        for key, term in keys:
+            for size in range(1, min(precomputed_prefix, len(key)) + 1):
+                buckets.setdefault(key[:size], set()).add(term)
+        for prefix, bucket in buckets.items():
+            self.top[prefix] = heapq.nlargest(limit, bucket, key=lambda t: (terms[t][1], t))
+
+    def lookup(self, prefix: str) -> List[str]:
+        if prefix in self.top:
+            return self.top[prefix]
+        found = set()
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and self.keys[i][0].startswith(prefix):
+            found.add(self.keys[i][1])
+            i += 1
+        return heapq.nlargest(self.limit, found, key=lambda t: (self.terms[t][1], t))
+
+
+class SearchSuggestIndex:
+    """
+    In-memory type-ahead over search keywords and tag names weighted by search count
+    and recency. Indexes are built in background and rebuilt when older than refresh_interval,
+    searches not written to db yet and last search times are kept aside and ranked on lookup
+    """
+
+    def __init__(
+            self,
+            refresh_interval: float = SEARCH_SUGGEST_REFRESH_INTERVAL,
+            half_life: float = SEARCH_SUGGEST_RECENCY_HALF_LIFE,
+            precomputed_prefix: int = SEARCH_SUGGEST_PRECOMPUTED_PREFIX,
+            limit: int = SEARCH_SUGGEST_LIMIT,
+    ):
+        self.refresh_interval = refresh_interval
+        self.half_life = half_life
+        self.precomputed_prefix = precomputed_prefix
+        self.limit = limit
+        # project_id -> (built_at, index)
+        self._indexes: Dict[int, Tuple[float, _ProjectSuggestions]] = {}
+        # project_id -> searches missing in db counts of the index
+        self._pending: Dict[int, Counter] = {}
+        # project_id -> {keyword: last searched at}, survives rebuilds
+        self._last_seen: Dict[int, Dict[str, float]] = {}
+        self._refreshing: set = set()
+        self._lock = Lock()
+
+    def _compute(self, project_id: int) -> _ProjectSuggestions:
+        with db.with_project_schema_session(project_id) as session:
+            keywords = session.query(SearchRequest.search_keyword, SearchRequest.count).all()
+            tag_names = [row[0] for row in session.query(Tag.name).distinct().all()]
+        terms = {}
+        for tag_name in tag_names:
+            terms[tag_name] = ('tag', 1.0)
+        for keyword, count in keywords:
+            kind = 'tag' if keyword in terms else 'keyword'
+            terms[keyword] = (kind, max(log1p(count or 0), terms.get(keyword, (None, 0))[1]))
+        return _ProjectSuggestions(terms, self.precomputed_prefix, self.limit)
+
+    def _recency(self, last_seen: Optional[float], now: float) -> float:
+        if last_seen is None:
+            return 0.0
+        return 0.5 ** ((now - last_seen) / self.half_life)
+
+    def _rebuild(self, project_id: int) -> None:
+        try:
+            with self._lock:
+                recorded = self._pending.get(project_id, Counter())
+                self._pending[project_id] = Counter()
+            # searches buffered by stats writer are not in db counts read below
+            pending = SEARCH_STATS.pending(project_id)
+            try:
+                index = self._compute(project_id)
+            except Exception:
+                with self._lock:
+                    self._pending.setdefault(project_id, Counter()).update(recorded)
+                raise
+            now = time()
+            with self._lock:
+                self._indexes[project_id] = (monotonic(), index)
+                self._pending.setdefault(project_id, Counter()).update(pending)
+                # recency of searches older than ten half-lives is negligible
+                last_seen = self._last_seen.get(project_id, {})
+                for keyword, seen_at in list(last_seen.items()):
+                    if now - seen_at > 10 * self.half_life:
+                        del last_seen[keyword]
+        except Exception as e:
+            log.warning(f'Could not build search suggestions for project {project_id}: {e}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(project_id)
+
+    def _refresh(self, project_id: int) -> None:
+        with self._lock:
+            if project_id in self._refreshing:
+                return
+            self._refreshing.add(project_id)
+        Thread(target=self._rebuild, args=(project_id,), daemon=True).start()
+
+    def _get_index(self, project_id: int) -> _ProjectSuggestions:
+        entry = self._indexes.get(project_id)
+        if entry is None:
+            # recent searches are suggested until the first build finished
+            self._refresh(project_id)
+            return _ProjectSuggestions({}, self.precomputed_prefix, self.limit)
+        if monotonic() - entry[0] >= self.refresh_interval:
+            self._refresh(project_id)
+        return entry[1]
+
+    def suggest(self, project_id: int, prefix: str, limit: Optional[int] = None) -> List[dict]:
+        """ Best terms starting with prefix or having a word starting with it """
+        limit = min(limit or self.limit, self.limit)
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        index = self._get_index(project_id)
+        now = time()
+        with self._lock:
+            pending = dict(self._pending.get(project_id, {}))
+            last_seen = dict(self._last_seen.get(project_id, {}))
+
+        matched = set(index.lookup(prefix))
+        for keyword in last_seen:
+            lowered = keyword.lower()
+            if lowered.startswith(prefix) or f' {prefix}' in f' {lowered}':
+                matched.add(keyword)
+
+        candidates = {}
+        for term in matched:
+            kind, weight = index.terms.get(term, ('keyword', 0.0))
+            if term in pending:
+                weight = max(weight, log1p(expm1(weight) + pending[term]))
+            candidates[term] = (kind, weight + self._recency(last_seen.get(term), now))
+
+        best = heapq.nlargest(limit, candidates.items(), key=lambda item: (item[1][1], item[0]))
+        return [
+            {'suggestion': term, 'type': kind, 'weight': round(weight, 4)}
+            for term, (kind, weight) in best
+        ]
+
+    def record(self, project_id: int, keywords: Iterable[str]) -> None:
+        """ Count searches missing in the index so they are suggested before the next build """
+        now = time()
+        with self._lock:
+            pending = self._pending.setdefault(project_id, Counter())
+            last_seen = self._last_seen.setdefault(project_id, {})
+            for keyword in keywords:
+                pending[keyword] += 1
+                last_seen[keyword] = now
+
+    def invalidate(self, project_id: Optional[int] = None) -> None:
+        with self._lock:
+            if project_id is None:
+                self._indexes.clear()
+                self._pending.clear()
+                self._last_seen.clear()
+            else:
+                self._indexes.pop(project_id, None)
+                self._pending.pop(project_id, None)
+                self._last_seen.pop(project_id, None)
+        log.debug(f'Search suggestions invalidated: {project_id or "all"}')
+
+
+SEARCH_SUGGESTIONS = SearchSuggestIndex()
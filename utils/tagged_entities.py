@@ -0,0 +1,85 @@
+from threading import Lock
+from typing import FrozenSet, Iterable, Optional
+
+from flask import has_request_context, request
+from sqlalchemy import Integer, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from pylon.core.tools import log
+from tools import db
+
+from .cache import LRUCache
+from .constants import TAGGED_ENTITIES_CACHE_SIZE, TAGGED_ENTITIES_CACHE_TTL
+from ...promptlib_shared.utils.utils import get_entities_by_tags
+
+
+TAGGED_ENTITIES_CACHE = LRUCache(maxsize=TAGGED_ENTITIES_CACHE_SIZE, ttl=TAGGED_ENTITIES_CACHE_TTL)
+
+# environ is shared by copies of request context, so fan_out workers see the same memo
+_REQUEST_MEMO_KEY = 'prompt_lib.tagged_entities'
+
+
+def _request_memo() -> Optional[dict]:
+    if not has_request_context():
+        return None
+    return request.environ.setdefault(_REQUEST_MEMO_KEY, {'lock': Lock(), 'ids': {}})
+
+
+def _resolve(project_id: int, tags: FrozenSet[int], Entity, EntityVersion, session=None) -> FrozenSet[int]:
+    if session is not None:
+        return frozenset(get_entities_by_tags(
+            project_id, list(tags),
+            entity_type=Entity,
+            entity_version_type=EntityVersion,
+            session=session,
+            subquery=False
+        ))
+    with db.with_project_schema_session(project_id) as session:
+        return _resolve(project_id, tags, Entity, EntityVersion, session)
+
+
+def _lookup(key, project_id: int, tags: FrozenSet[int], Entity, EntityVersion, session=None) -> FrozenSet[int]:
+    if not TAGGED_ENTITIES_CACHE_TTL:
+        return _resolve(project_id, tags, Entity, EntityVersion, session)
+    return TAGGED_ENTITIES_CACHE.get_or_set(
+        key, lambda: _resolve(project_id, tags, Entity, EntityVersion, session)
+    )
+
+
+def get_tagged_entity_ids(
+        project_id: int,
+        tags: Iterable[int],
+        Entity,
+        EntityVersion,
+        session=None
+) -> FrozenSet[int]:
+    """
+    Ids of entities matching tags, resolved once per request and kept
+    for TAGGED_ENTITIES_CACHE_TTL seconds across requests
+
+    :param session: project session to resolve with, a new one is opened if None
+    """
+    tags = frozenset(int(tag) for tag in tags)
+    key = (project_id, Entity.__tablename__, tags)
+    memo = _request_memo()
+    if memo is None:
+        return _lookup(key, project_id, tags, Entity, EntityVersion, session)
+    if key in memo['ids']:
+        return memo['ids'][key]
+    with memo['lock']:
+        if key not in memo['ids']:
+            memo['ids'][key] = _lookup(key, project_id, tags, Entity, EntityVersion, session)
+    return memo['ids'][key]
+
+
+def id_in(column, ids: Iterable[int]):
+    """ column = ANY(array) with ids sent as one array parameter instead of a bind per id """
+    return column == any_(literal(sorted(ids), ARRAY(Integer)))
+
+
+def invalidate_tagged_entities(project_id: Optional[int] = None) -> None:
+    if project_id is None:
+        TAGGED_ENTITIES_CACHE.clear()
+    else:
+        TAGGED_ENTITIES_CACHE.invalidate(lambda key: key[0] == project_id)
+    log.debug(f'Tagged entities invalidated: {project_id or "all"}')
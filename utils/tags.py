@@ -1,14 +1,16 @@
 from abc import ABCMeta, abstractmethod
 from json import loads
 from datetime import datetime
-from typing import List, Dict
-from sqlalchemy import func, cast, String, or_, not_
+from sqlalchemy import func, cast, String, or_, not_, select
 from sqlalchemy.orm import joinedload
 
 from tools import db, rpc_tools
 from pylon.core.tools import log
 
+from .collection_membership import collection_entity_ids
+from .full_text import search_condition
 from .like_utils import add_likes, add_trending_likes, add_my_liked
+from .model_registry import get_rpc_model
 from ..models.all import Collection, Prompt, PromptVersion, PromptVersionTagAssociation
 from ...promptlib_shared.models.all import Tag
 
@@ -61,12 +63,7 @@ class TagList(metaclass=TagListABC):
             statuses = statuses.split(',')
             filters.append(self.Entity.versions.any(self.Version.status.in_(statuses)))
         if query := self.args.get('query'):
-            filters.append(
-                or_(
-                    self.Entity.name.ilike(f"%{query}%"),
-                    self.Entity.description.ilike(f"%{query}%")
-                )
-            )
+            filters.append(search_condition(self.Entity, query))
         return filters
 
     def add_related_entity_extra_filters(self, filters):
@@ -112,11 +109,10 @@ class TagList(metaclass=TagListABC):
         if search := self.args.get("search"):
             tag_filters.append(Tag.name.ilike(f"%{search}%"))
         if self._is_collection:
-            all_prompt_ids = [
-                prompt['id'] for collection in self.session.query(Collection.prompts).all()
-                for prompt in next(iter(collection))
-            ]
-            tag_filters.append(getattr(self.Version, self.foriegn_key).in_(all_prompt_ids))
+            # prompts of this project included in any collection, semi-join on membership index
+            tag_filters.append(
+                getattr(self.Version, self.foriegn_key).in_(collection_entity_ids(self.project_id, 'prompt'))
+            )
         return tag_filters
 
     def execute_main_query(self, tag_filters):
@@ -134,14 +130,23 @@ class TagList(metaclass=TagListABC):
         order_by = Tag.id.desc()
         order_by = func.count(func.distinct(getattr(self.Version, self.foriegn_key))).desc()
         query = query.order_by(order_by)
-        total = query.count()
+        # total of groups computed along with the page instead of a separate count()
+        query = query.add_columns(func.count().over().label('total'))
 
         if self.limit:
             query = query.limit(self.limit)
         if self.offset:
             query = query.offset(self.offset)
 
-        return total, query.all()
+        rows = query.all()
+        if rows:
+            total = rows[0][-1]
+        elif self.offset:
+            # page past the end, window total is not available
+            total = query.limit(None).offset(None).count()
+        else:
+            total = 0
+        return total, rows
     
     def _as_dict(self, x):
         result = {'id': x[0], 'name': x[1], 'data': loads(x[2])}
@@ -178,46 +183,25 @@ class TagList(metaclass=TagListABC):
 
 
 class PromptTagList(TagList):
-    def _flatten_prompt_ids(self, project_id: int, collection_prompts: List[Dict[str, int]]):
-        prompt_ids = []
-        for collection_prompt in collection_prompts:
-            prompts = collection_prompt[0]
-            for prompt in prompts:
-                if prompt['owner_id'] == project_id:
-                    prompt_ids.append(prompt['id'])
-        return prompt_ids
-    
     def add_related_entity_extra_filters(self, filters):
         if collection_phrase := self.args.get('collection_phrase'):
-            collection_prompts = self.session.query(Collection.prompts).filter(
+            collection_ids = select(Collection.id).where(
                 or_(
                     Collection.name.ilike(f"%{collection_phrase}%"),
                     Collection.description.ilike(f"%{collection_phrase}%")
                 )
-            ).all()
-            prompt_ids = prompt_ids = self._flatten_prompt_ids(self.project_id, collection_prompts)
-            filters.append(Prompt.id.in_(prompt_ids))
+            )
+            filters.append(Prompt.id.in_(collection_entity_ids(self.project_id, 'prompt', collection_ids)))
 
         if self.args.get("my_liked_collections", False):
-            query = self.session.query(Collection.prompts)
-            extra_columns = []
-
-            query, new_columns = add_likes(
-                original_query=query,
-                project_id=self.project_id,
-                entity=Collection,
-            )
-            extra_columns.extend(new_columns)
-            query, new_columns = add_my_liked(
-                original_query=query,
+            query, _ = add_my_liked(
+                original_query=self.session.query(Collection.id),
                 project_id=self.project_id,
                 entity=Collection,
                 filter_results=True
             )
-            extra_columns.extend(new_columns)
-            q_result = query.all()
-            prompt_ids = self._flatten_prompt_ids(self.project_id, q_result)
-            filters.append(Prompt.id.in_(prompt_ids))
+            collection_ids = query.with_entities(Collection.id).statement
+            filters.append(Prompt.id.in_(collection_entity_ids(self.project_id, 'prompt', collection_ids)))
         
         return filters
 
@@ -235,9 +219,9 @@ class DatasourceTagList(TagList):
         self.rpc = rpc_tools.RpcMixin().rpc.call
 
     def set_related_entity_info(self):
-        self.Entity = self.rpc.datasources_get_datasource_model()
-        self.Version = self.rpc.datasources_get_version_model()
-        self.VersionTagAssociation = self.rpc.datasources_get_version_association_model()
+        self.Entity = get_rpc_model('datasources_get_datasource_model')
+        self.Version = get_rpc_model('datasources_get_version_model')
+        self.VersionTagAssociation = get_rpc_model('datasources_get_version_association_model')
         self.foriegn_key = 'datasource_id'
         self.count_name = "datasource_count"
 
@@ -248,9 +232,9 @@ class ApplicationTagList(TagList):
         self.rpc = rpc_tools.RpcMixin().rpc.call
 
     def set_related_entity_info(self):
-        self.Entity = self.rpc.applications_get_application_model()
-        self.Version = self.rpc.applications_get_version_model()
-        self.VersionTagAssociation = self.rpc.applications_get_version_association_model()
+        self.Entity = get_rpc_model('applications_get_application_model')
+        self.Version = get_rpc_model('applications_get_version_model')
+        self.VersionTagAssociation = get_rpc_model('applications_get_version_association_model')
         self.foriegn_key = 'application_id'
         self.count_name = "application_count"
 
@@ -268,9 +252,9 @@ class PipelineTagList(TagList):
         self.rpc = rpc_tools.RpcMixin().rpc.call
 
     def set_related_entity_info(self):
-        self.Entity = self.rpc.applications_get_application_model()
-        self.Version = self.rpc.applications_get_version_model()
-        self.VersionTagAssociation = self.rpc.applications_get_version_association_model()
+        self.Entity = get_rpc_model('applications_get_application_model')
+        self.Version = get_rpc_model('applications_get_version_model')
+        self.VersionTagAssociation = get_rpc_model('applications_get_version_association_model')
         self.foriegn_key = 'application_id'
         self.count_name = "application_count"
 
@@ -0,0 +1,186 @@
+from queue import Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from pylon.core.tools import log
+from tools import db
+
+from .constants import TENANT_SETUP_RETRY_INTERVAL
+from ..models.all import CollectionEntity, EntityLikes, EntityLikesBucket, TenantSetupStep
+
+
+# tables declared after tenants were created, create_all of new tenants has them already
+SETUP_TABLES = (TenantSetupStep, EntityLikes, EntityLikesBucket, CollectionEntity)
+
+_STOP = object()
+
+
+class _CreateIndexConcurrently(CreateIndex):
+    pass
+
+
+class _DropIndexConcurrently(DropIndex):
+    pass
+
+
+@compiles(_CreateIndexConcurrently, 'postgresql')
+@compiles(_DropIndexConcurrently, 'postgresql')
+def _compile_concurrently(element, compiler, **kw):
+    ddl = getattr(compiler, f'visit_{element.__visit_name__}')(element, **kw)
+    return ddl.replace('INDEX ', 'INDEX CONCURRENTLY ', 1)
+
+
+def create_index_concurrently(project_id: int, index) -> None:
+    """ Build index without blocking writes to its table, has to run outside of a transaction """
+    with db.with_project_schema_session(project_id) as session:
+        connection = session.connection(execution_options={'isolation_level': 'AUTOCOMMIT'})
+        try:
+            connection.execute(_CreateIndexConcurrently(index, if_not_exists=True))
+        except Exception:
+            # failed concurrent build leaves an invalid index, IF NOT EXISTS would keep it forever
+            connection.execute(_DropIndexConcurrently(index, if_exists=True))
+            raise
+
+
+class TenantSetup:
+    """
+    Setup steps of existing tenants run off the request path, e.g. indexes declared after
+    a tenant was created or backfills of derived tables. Completed steps are recorded in the
+    tenant so that every step runs once per tenant. Request paths check is_ready and use
+    their fallback until the step of the project completed
+
+    :param retry_interval: seconds before a project with failed steps is set up again
+    """
+
+    def __init__(self, retry_interval: float = TENANT_SETUP_RETRY_INTERVAL):
+        self.retry_interval = retry_interval
+        self._steps: Dict[str, Callable[[int], None]] = {}
+        self._done: Dict[int, frozenset] = {}
+        self._failed_at: Dict[int, float] = {}
+        self._queued: Set[int] = set()
+        self._queue: Queue = Queue()
+        self._lock = Lock()
+        self._worker: Optional[Thread] = None
+
+    def step(self, name: str):
+        """ Register fn(project_id) as setup step, steps run in order of registration """
+        def decorator(fn: Callable[[int], None]):
+            self._steps[name] = fn
+            return fn
+        return decorator
+
+    def is_ready(self, project_id: int, step: str) -> bool:
+        """ Whether step completed for the project, schedules its setup otherwise """
+        done = self._done.get(project_id)
+        if done is not None and step in done:
+            return True
+        self.schedule(project_id)
+        return False
+
+    def ready_projects(self, step: str) -> List[int]:
+        """ Projects of this process the step completed for """
+        return [project_id for project_id, done in list(self._done.items()) if step in done]
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = Thread(target=self._run, name='prompt_lib_tenant_setup', daemon=True)
+                self._worker.start()
+
+    def schedule(self, project_id: int) -> None:
+        with self._lock:
+            if project_id in self._queued:
+                return
+            failed_at = self._failed_at.get(project_id)
+            if failed_at is not None and monotonic() - failed_at < self.retry_interval:
+                return
+            self._queued.add(project_id)
+        self._ensure_worker()
+        self._queue.put(project_id)
+
+    def schedule_all(self, project_ids: Iterable[int]) -> None:
+        for project_id in project_ids:
+            self.schedule(project_id)
+
+    def _run(self) -> None:
+        while True:
+            project_id = self._queue.get()
+            if project_id is _STOP:
+                return
+            try:
+                self.setup(project_id)
+            except Exception as e:
+                log.error(f'Tenant setup of project {project_id} failed: {e}')
+                with self._lock:
+                    self._failed_at[project_id] = monotonic()
+            finally:
+                with self._lock:
+                    self._queued.discard(project_id)
+
+    def setup(self, project_id: int) -> List[str]:
+        """
+        Create missing tables and run steps not completed in the project yet
+
+        :param project_id:
+        :return: names of failed steps
+        """
+        with db.with_project_schema_session(project_id) as session:
+            for model in SETUP_TABLES:
+                model.__table__.create(bind=session.connection(), checkfirst=True)
+            session.commit()
+            done = {step for step, in session.query(TenantSetupStep.step).all()}
+
+        failed = []
+        for name, fn in self._steps.items():
+            if name in done:
+                continue
+            log.info(f'Running tenant setup step {name} of project {project_id}')
+            try:
+                fn(project_id)
+                with db.with_project_schema_session(project_id) as session:
+                    session.execute(
+                        insert(TenantSetupStep).values(step=name).on_conflict_do_nothing(
+                            constraint='_prompt_lib_setup_step_uc'
+                        )
+                    )
+                    session.commit()
+            except Exception as e:
+                log.error(f'Tenant setup step {name} of project {project_id} failed: {e}')
+                failed.append(name)
+                continue
+            done.add(name)
+
+        self._done[project_id] = frozenset(done)
+        with self._lock:
+            if failed:
+                self._failed_at[project_id] = monotonic()
+            else:
+                self._failed_at.pop(project_id, None)
+        return failed
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Stop the worker, projects not set up yet are scheduled again on next start """
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+        self._queue.put(_STOP)
+        worker.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'steps': list(self._steps),
+                'ready_projects': sum(len(done) == len(self._steps) for done in self._done.values()),
+                'queued_projects': len(self._queued),
+                'failed_projects': len(self._failed_at),
+            }
+
+
+TENANT_SETUP = TenantSetup()
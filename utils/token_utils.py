@@ -0,0 +1,172 @@
+import json
+from hashlib import sha256
+from typing import List, Literal, Optional, Sequence, Tuple
+
+from .cache import LRUCache
+from .constants import MESSAGE_TOKENS_CACHE_SIZE, STREAM_TOKENS_FLUSH_CHARS
+
+
+PackingStrategy = Literal['greedy', 'density']
+
+
+def pack_context(
+        encoding,
+        context: str,
+        chunks: Sequence[str],
+        token_budget: int,
+        strategy: PackingStrategy = 'greedy',
+        scores: Optional[Sequence[float]] = None,
+) -> Tuple[str, int]:
+    """
+    Append similarity search chunks to context within token budget.
+    Every chunk is encoded exactly once and the total is kept as a running sum
+
+    :param encoding: tiktoken encoding
+    :param context: initial context
+    :param chunks: chunks ordered by relevance, most relevant first
+    :param token_budget: max tokens for the resulting context
+    :param strategy: greedy - take chunks in order and stop at the first one that does not fit,
+        density - take chunks with the best relevance per token that fit, keeping original order
+    :param scores: relevance of chunks, rank based if not given
+    :return: packed context and its token count
+    """
+    total = len(encoding.encode(context))
+    chunk_tokens = [len(encoding.encode(chunk)) for chunk in chunks]
+
+    if strategy == 'density':
+        if scores is None:
+            scores = [len(chunks) - idx for idx in range(len(chunks))]
+        order = sorted(
+            range(len(chunks)),
+            key=lambda idx: scores[idx] / max(chunk_tokens[idx], 1),
+            reverse=True
+        )
+        selected: List[int] = []
+        for idx in order:
+            if total + chunk_tokens[idx] <= token_budget:
+                selected.append(idx)
+                total += chunk_tokens[idx]
+        selected.sort()
+    else:
+        selected = []
+        for idx, tokens in enumerate(chunk_tokens):
+            if total + tokens > token_budget:
+                break
+            selected.append(idx)
+            total += tokens
+
+    return context + ''.join(chunks[idx] for idx in selected), total
+
+
+MESSAGE_TOKENS_CACHE = LRUCache(maxsize=MESSAGE_TOKENS_CACHE_SIZE)
+
+
+def _digest(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return sha256(value.encode()).hexdigest()
+
+
+class TokenAccountant:
+    """
+    Counts tokens through worker_client remembering them per message text.
+    A conversation is the sum of its messages, so each chat turn only counts messages
+    not seen before, e.g. the new user message. Counted model output is remembered too
+    and is not counted again when it comes back as assistant message of the next turn
+    """
+
+    def __init__(self, worker_client, integration_name: str, settings):
+        self.worker_client = worker_client
+        self.integration_name = integration_name
+        self.settings = settings
+        try:
+            self._model_key = settings.merged_settings.get('model_name')
+        except AttributeError:
+            self._model_key = None
+
+    def _count(self, data) -> int:
+        return self.worker_client.ai_count_tokens(
+            integration_name=self.integration_name,
+            settings=self.settings,
+            data=data,
+        )
+
+    def _key(self, kind: str, value) -> tuple:
+        return self.integration_name, self._model_key, kind, _digest(value)
+
+    def _overhead(self) -> Tuple[int, int]:
+        """
+        Tokens added around message texts when a conversation is counted:
+        (once per conversation, once per message). Measured once per model
+        """
+        def measure():
+            message = {'role': 'user', 'content': 'hello'}
+            one = self._count([message])
+            two = self._count([message, message])
+            per_message = two - one
+            return max(one - per_message, 0), max(per_message - self.text_tokens('hello'), 0)
+        return MESSAGE_TOKENS_CACHE.get_or_set((self.integration_name, self._model_key, 'overhead'), measure)
+
+    def text_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        return MESSAGE_TOKENS_CACHE.get_or_set(self._key('text', text), lambda: self._count(text))
+
+    def remember_text(self, text: str, tokens: int) -> None:
+        """ Store tokens of a text counted elsewhere, e.g. reported by the model or counted in parts """
+        if text:
+            MESSAGE_TOKENS_CACHE.set(self._key('text', text), tokens)
+
+    def message_tokens(self, message: dict) -> int:
+        content = message.get('content') if isinstance(message, dict) else None
+        if isinstance(content, str):
+            return self._overhead()[1] + self.text_tokens(content)
+        # e.g. content parts with images, counted as a whole message
+        return MESSAGE_TOKENS_CACHE.get_or_set(
+            self._key('message', message),
+            lambda: max(self._count([message]) - self._overhead()[0], 0)
+        )
+
+    def conversation_tokens(self, conversation: List[dict]) -> int:
+        if not conversation:
+            return 0
+        return self._overhead()[0] + sum(self.message_tokens(message) for message in conversation)
+
+    def stream_counter(self) -> 'StreamTokenCounter':
+        return StreamTokenCounter(self)
+
+
+class StreamTokenCounter:
+    """
+    Counts streamed output as it arrives: every flush_chars of text are counted
+    up to the last whitespace, so total() only counts the tail of the stream
+
+    :param accountant: token accountant of the prediction
+    :param flush_chars: pending text length triggering a count
+    """
+
+    def __init__(self, accountant: TokenAccountant, flush_chars: int = STREAM_TOKENS_FLUSH_CHARS):
+        self.accountant = accountant
+        self.flush_chars = flush_chars
+        self._text: List[str] = []
+        self._pending = ''
+        self._counted = 0
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._text.append(chunk)
+        self._pending += chunk
+        if len(self._pending) < self.flush_chars:
+            return
+        # cut at whitespace, tokens rarely span it
+        cut = max(self._pending.rfind(' '), self._pending.rfind('\n')) + 1 or len(self._pending)
+        self._counted += self.accountant._count(self._pending[:cut])
+        self._pending = self._pending[cut:]
+
+    def total(self) -> int:
+        if self._pending:
+            self._counted += self.accountant._count(self._pending)
+            self._pending = ''
+        self.accountant.remember_text(''.join(self._text), self._counted)
+        return self._counted